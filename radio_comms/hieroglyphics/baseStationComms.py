@@ -19,7 +19,8 @@ from serialReaderWriter import SerialReaderWriter
 from socketReaderWriter import SocketReaderWriter
 from userInterface import UserInterface
 from scheduler import Scheduler
-from concurrentSet import ConcurrentSet
+from duplicateDetector import DuplicateDetector
+from fileTransfer import FileTransfer
 
 #######################
 ##### GLOBAL VARS #####
@@ -52,12 +53,14 @@ def main():
     } 
 
     scheduler : Scheduler = Scheduler(readerWriter, topics)
-    userInterface : UserInterface = UserInterface(MSG_LOG, scheduler)
+    scheduler.set_compression('all', 'zlib')
+    fileTransfer : FileTransfer = FileTransfer(scheduler)
+    userInterface : UserInterface = UserInterface(MSG_LOG, scheduler, fileTransfer)
 
     # 3 concurrent threads: one read from serial port, 
     # one for processing messages, one for writing messages
     executor = concurrent.futures.ThreadPoolExecutor(4)
-    future = executor.submit(processMessages, messageQueue, scheduler, ERR_LOG)
+    future = executor.submit(processMessages, messageQueue, scheduler, ERR_LOG, fileTransfer)
     future = executor.submit(readMessages, readerWriter, messageQueue)
     future = executor.submit(scheduler.sendMessages, messageQueue)
 
@@ -83,9 +86,9 @@ def readMessages(readerWriter : ReaderWriter, messageQueue : MessageQueue) -> No
             print('message added', len(messageQueue))
     print('exited reading')
 
-def processMessages(messageQueue : MessageQueue, scheduler : Scheduler, ERR_LOG : str) -> None:
-    messageProcessor = BaseStationMessageProcessor(ERR_LOG, scheduler)
-    alreadyProcessedMessages = ConcurrentSet()
+def processMessages(messageQueue : MessageQueue, scheduler : Scheduler, ERR_LOG : str, fileTransfer : FileTransfer) -> None:
+    messageProcessor = BaseStationMessageProcessor(ERR_LOG, scheduler, fileTransfer)
+    alreadyProcessedMessages = DuplicateDetector()
     try:
      while messageQueue.isRunning():
         print('popping message...')
@@ -95,18 +98,17 @@ def processMessages(messageQueue : MessageQueue, scheduler : Scheduler, ERR_LOG
 
         print(f"message popped of purpose {currentMessage.purpose}")
 
-        if currentMessage.purpose == Message.Purpose.ACK:
+        if currentMessage.purpose in (Message.Purpose.ACK, Message.Purpose.ACK_BATCH):
             messageProcessor.handleAcknowledgment(currentMessage)
             continue
 
-        acknowledgment = messageProcessor.generateAcknowledgment(currentMessage) 
-        scheduler.addMessage(acknowledgment, 'acknowledgment')
+        messageProcessor.acknowledge(currentMessage)
 
         # We've already processed this message.
-        if currentMessage.msg_id in alreadyProcessedMessages:
+        if alreadyProcessedMessages.isDuplicate(currentMessage.msg_id, currentMessage.session):
             continue
 
-        alreadyProcessedMessages.add(currentMessage.msg_id)
+        alreadyProcessedMessages.add(currentMessage.msg_id, currentMessage.session)
 
         if currentMessage.purpose == Message.Purpose.ERROR: 
             messageProcessor.handleDebugMessage(currentMessage)
@@ -124,7 +126,7 @@ def processMessages(messageQueue : MessageQueue, scheduler : Scheduler, ERR_LOG
             messageProcessor.handleLowDefPhotoMessage(currentMessage)
 
         elif currentMessage.purpose == Message.Purpose.FILE_CONTENTS:
-            messageProcessor.readFileOverPort(currentMessage) 
+            messageProcessor.handleFileTransferMessage(currentMessage)
 
         else:
             print("unknown message purpose")
@@ -1,81 +1,88 @@
 import cv2
 import os
+import struct
 import time
 import traceback
 import numpy as np
+from deltaFrame import DeltaCompositor, isDeltaFrame
+from fileTransfer import FileTransfer
 from message import Message
 from messageProcessor import MessageProcessor
+from progressivePhoto import unpackTier
+from reassembler import Reassembler
 from scheduler import Scheduler
 
 class BaseStationMessageProcessor:
 
-    class OngoingBytes:
-        def __init__(self, name : str):
-            self.name = name
-            self.bytestring = b''
-            self.count = 0
+    # second byte of a VIDEO message asking the rover for a keyframe
+    KEYFRAME_REQUEST=2
 
-        def reset(self):
-            self.bytestring = b''
-            self.count = 0
-
-    def __init__(self, log : str, scheduler : Scheduler):
-        self.currentFile = ""
+    def __init__(self, log : str, scheduler : Scheduler, fileTransfer : FileTransfer=None):
         self.counter = 0
         self.messageProcessor = MessageProcessor(log, scheduler)
-        self.lowDefPhotoBytes = self.OngoingBytes('ldp')
-        self.highDefPhotoBytes = self.OngoingBytes('hdp')
-        self.videoFeedBytes = self.OngoingBytes('vid')
-
-    def generateAcknowledgment(self, message : Message) -> Message:
-        return self.messageProcessor.generateAcknowledgment(message)
+        # shared with the user interface, which starts the transfers this side sends
+        self.fileTransfer = fileTransfer if fileTransfer is not None else FileTransfer(scheduler)
+        self.reassembler = Reassembler()
+        self.deltaCompositor = DeltaCompositor(self.requestKeyframe)
+        # best tier saved so far per HD photo number, a late lower tier must not replace it
+        self.photoTiers : dict[int, int] = {}
 
     def handleAcknowledgment(self, message : Message):
         self.messageProcessor.handleAcknowledgment(message)
 
+    def acknowledge(self, message : Message) -> None:
+        self.messageProcessor.acknowledge(message)
+
     def handleDebugMessage(self, message : Message):
         self.messageProcessor.handleDebugMessage(message)
 
-    def readFileOverPort(self, message : Message) -> None:
-        if message.number == 1:
-            self.currentFile = message.get_payload().decode()
-            print(f'copying file {self.currentFile}...')
-
-        elif message.number == 0:
-            with open(f'./{self.currentFile}', 'ab') as f:
-                f.write(message.get_payload())
-            print(f"file {self.currentFile} received.")
-            self.currentFile = ""
+    def handleFileTransferMessage(self, message : Message) -> None:
+        self.fileTransfer.handleMessage(message)
 
-        elif not self.currentFile:
-            error_str = "--Error: file contents received, but no file name for said contents."
-            print(error_str, file=sys.stderr)
-
-        else:
-            print(f'writing to {self.currentFile}.')
-            with open(f'./{self.currentFile}', 'ab') as f:
-                f.write(message.get_payload())
-
-    def handleOngoingMessage(self, message : Message, ongoingBytes : OngoingBytes):
-        print('received another ldp message')
-        if ongoingBytes.count < message.number:
-            ongoingBytes.bytestring += message.get_payload()
-            ongoingBytes.count += 1
-        else:
-            print('received final ldp message')
-            ongoingBytes.bytestring += message.get_payload()
-            buffer = ongoingBytes.bytestring
-            ongoingBytes.reset()
-            self.saveImage(buffer, ongoingBytes.name)
+    # photos and video frames arrive as chunked transfers; save each one once it is complete
+    def handleOngoingMessage(self, message : Message, folder : str):
+        buffer = self.reassembler.addChunk(message)
+        if buffer is not None:
+            print(f'received complete {folder} image')
+            self.saveImage(buffer, folder)
 
+    # delta mode frames are put back together before saving
     def handleVideoMessage(self, message : Message) -> None:
-        self.handleOngoingMessage(message, self.videoFeedBytes)
+        buffer = self.reassembler.addChunk(message)
+        if buffer is None:
+            return
+        if not isDeltaFrame(buffer):
+            print('received complete vid image')
+            self.saveImage(buffer, 'vid')
+            return
+        for frame in self.deltaCompositor.apply(buffer):
+            print('received complete vid image')
+            self.saveFrame(frame, 'vid')
+
+    # see RoverMessageProcessor.handleVideoToggleMessage
+    def requestKeyframe(self) -> None:
+        self.messageProcessor.addMessage(Message(new=True, purpose=Message.Purpose.VIDEO, payload=struct.pack(">bB", 0, BaseStationMessageProcessor.KEYFRAME_REQUEST)))
 
     def handleLowDefPhotoMessage(self, message : Message) -> None:
-        self.handleOngoingMessage(message, self.lowDefPhotoBytes)
+        self.handleOngoingMessage(message, 'ldp')
 
+    # every resolution tier of a photo overwrites the same file, so it sharpens in place
     def handleHighDefPhotoMessage(self, message : Message) -> None:
-        self.handleOngoingMessage(message, self.highDefPhotoBytes)
+        buffer = self.reassembler.addChunk(message)
+        if buffer is None:
+            return
+        photoNumber, tier, tierCount, jpeg = unpackTier(buffer)
+        if tier < self.photoTiers.get(photoNumber, -1):
+            return
+        self.photoTiers[photoNumber] = tier
+        print(f'received hdp photo {photoNumber}, {tier + 1} of {tierCount} resolutions')
+        if not os.path.isdir('hdp'):
+            os.mkdir('hdp')
+        path = f'hdp/hdp_{photoNumber}.jpg'
+        # replace the whole file at once so a viewer never shows half a photo
+        with open(f'{path}.tmp', 'wb') as f:
+            f.write(jpeg)
+        os.replace(f'{path}.tmp', path)
 
     def saveImage(self, buffer : bytearray, folder : str) -> None:
         #buffer = buffer.frombytes()
@@ -84,6 +91,9 @@ class BaseStationMessageProcessor:
         # and displayed (".imshow"))
         image = np.frombuffer(buffer, dtype=np.uint8)
         frame = cv2.imdecode(image, 1)
+        self.saveFrame(frame, folder)
+
+    def saveFrame(self, frame, folder : str) -> None:
         if not os.path.isdir(f"{folder}"):
             os.mkdir(f"{folder}")
         cv2.imwrite(f"{folder}/{folder}_{self.counter}.jpg", frame)
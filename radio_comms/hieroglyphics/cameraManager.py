@@ -0,0 +1,165 @@
+import itertools
+import threading
+import time
+
+import cv2
+
+# Pool of camera handles, addressed by index into cameraPaths
+# (e.g. /dev/v4l/by-id paths, which survive replugging unlike /dev/videoN).
+# Each camera is opened the first time it is asked for and then kept open
+# with its own grabber thread, so switching between cameras costs one frame,
+# not a device open, and several cameras can be read at the same time.
+class CameraManager:
+
+    # how long to wait for a fresh frame before giving up
+    FRAME_TIMEOUT=1.0
+    # how long to wait for a camera to open first, which may take a few seconds (e.g. a ZED)
+    OPEN_TIMEOUT=5.0
+    # wait between attempts to reopen a camera that stopped delivering
+    RECONNECT_DELAY=1.0
+
+    class Camera:
+        # The grabber thread only grabs, which is cheap, so the driver's queue
+        # never holds stale frames. A frame is decoded (retrieved) on the grabber
+        # thread when someone asks for one, keeping all calls on the handle on
+        # one thread. Guarded by self.condition.
+        def __init__(self, path, frameNumbers):
+            self.path = path
+            # shared by all cameras so frame numbers stay increasing across a switch
+            self.frameNumbers = frameNumbers
+            self.cap : cv2.VideoCapture = None
+            self.condition = threading.Condition()
+            # self.cap is open and grabbing
+            self.isOpen = False
+            self.frameNumber = 0
+            self.latestFrame = None
+            # grab the latest frame was retrieved from
+            self.latestNumber = 0
+            self.retrieveRequested = False
+            self.capturing = False
+            self.thread : threading.Thread = None
+            # only report a camera that won't open once, not on every retry
+            self.reportedFailure = False
+
+        def open(self) -> bool:
+            cap = cv2.VideoCapture(self.path)
+            if not cap.isOpened():
+                cap.release()
+                return False
+            # keep as little as possible queued in the driver
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            self.cap = cap
+            return True
+
+        def start(self) -> None:
+            with self.condition:
+                if self.capturing:
+                    return
+                self.capturing = True
+            self.thread = threading.Thread(target=self.grabLoop, daemon=True)
+            self.thread.start()
+
+        def stop(self) -> None:
+            with self.condition:
+                self.capturing = False
+                self.condition.notify_all()
+            if self.thread is not None:
+                self.thread.join()
+                self.thread = None
+
+        def grabLoop(self) -> None:
+            while self.capturing:
+                if self.cap is None:
+                    if not self.open():
+                        if not self.reportedFailure:
+                            print(f'--Error: could not open camera {self.path}, retrying.')
+                            self.reportedFailure = True
+                        time.sleep(CameraManager.RECONNECT_DELAY)
+                        continue
+                    self.reportedFailure = False
+                    with self.condition:
+                        self.isOpen = True
+                        self.condition.notify_all()
+
+                if not self.cap.grab():
+                    # unplugged or the driver hung up: reopen it
+                    print(f'--Error: camera {self.path} stopped delivering frames, reconnecting.')
+                    with self.condition:
+                        self.isOpen = False
+                    self.cap.release()
+                    self.cap = None
+                    time.sleep(CameraManager.RECONNECT_DELAY)
+                    continue
+
+                with self.condition:
+                    self.frameNumber = next(self.frameNumbers)
+                    number = self.frameNumber
+                    retrieve = self.retrieveRequested
+                if not retrieve:
+                    continue
+
+                ret, frame = self.cap.retrieve()
+                with self.condition:
+                    if ret:
+                        self.latestFrame = frame
+                        self.latestNumber = number
+                        self.retrieveRequested = False
+                    self.condition.notify_all()
+
+            with self.condition:
+                self.isOpen = False
+            if self.cap is not None:
+                self.cap.release()
+                self.cap = None
+
+        # (frame number, frame) of the current frame if it is newer than `after`,
+        # otherwise waits for the next grab; (after, None) on timeout.
+        # A camera that is still opening gets openTimeout for that on top.
+        def getLatestFrame(self, after : int=-1, timeout : float=None, openTimeout : float=None):
+            if timeout is None:
+                timeout = CameraManager.FRAME_TIMEOUT
+            if openTimeout is None:
+                openTimeout = CameraManager.OPEN_TIMEOUT
+            with self.condition:
+                if not self.condition.wait_for(lambda: not self.capturing or self.isOpen, openTimeout):
+                    return after, None
+                if self.latestFrame is not None and self.latestNumber == self.frameNumber and self.latestNumber > after:
+                    return self.latestNumber, self.latestFrame
+                wanted = max(after, self.latestNumber) + 1
+                self.retrieveRequested = True
+                self.condition.wait_for(lambda: not self.capturing or (self.latestFrame is not None and self.latestNumber >= wanted), timeout)
+                if self.latestFrame is None or self.latestNumber < wanted:
+                    return after, None
+                return self.latestNumber, self.latestFrame
+
+    # cameraPaths: anything cv2.VideoCapture opens, a single one or a list
+    def __init__(self, cameraPaths):
+        self.cameraPaths = cameraPaths if isinstance(cameraPaths, (list, tuple)) else [cameraPaths]
+        self.cameras : dict[int, CameraManager.Camera] = {}
+        self.frameNumbers = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.cameraPaths)
+
+    # the camera at an index, opened and grabbing from the first call on
+    def camera(self, index : int) -> 'CameraManager.Camera':
+        if not 0 <= index < len(self.cameraPaths):
+            raise IndexError(f'there is no camera {index}')
+        with self.lock:
+            camera = self.cameras.get(index)
+            if camera is None:
+                camera = CameraManager.Camera(self.cameraPaths[index], self.frameNumbers)
+                self.cameras[index] = camera
+        camera.start()
+        return camera
+
+    def getLatestFrame(self, index : int, after : int=-1, timeout : float=None, openTimeout : float=None):
+        return self.camera(index).getLatestFrame(after, timeout, openTimeout)
+
+    def close(self) -> None:
+        with self.lock:
+            cameras = list(self.cameras.values())
+            self.cameras.clear()
+        for camera in cameras:
+            camera.stop()
@@ -0,0 +1,119 @@
+import binascii
+import struct
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Checksum engines for the frame codec. Every engine can be fed
+# incrementally (e.g. header, then payload) with update() and
+# produces a fixed-size big-endian digest.
+# Both ends of a link must use the same engine.
+class Checksum:
+
+    SIZE = 0
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.value = 0
+
+    def update(self, data) -> 'Checksum':
+        return self
+
+    def digest(self) -> bytes:
+        return b''
+
+    @classmethod
+    def calculate(cls, data) -> bytes:
+        return cls().update(data).digest()
+
+
+# 1 byte XOR of every byte; the original hieroglyphics checksum
+class XorChecksum(Checksum):
+
+    SIZE = 1
+
+    def update(self, data) -> 'XorChecksum':
+        self.value ^= xorBytes(data)
+        return self
+
+    def digest(self) -> bytes:
+        return struct.pack(">B", self.value)
+
+
+# CRC-16/CCITT, catches burst errors that XOR lets through
+class Crc16Checksum(Checksum):
+
+    SIZE = 2
+
+    def reset(self) -> None:
+        self.value = 0xFFFF
+
+    def update(self, data) -> 'Crc16Checksum':
+        self.value = binascii.crc_hqx(data, self.value)
+        return self
+
+    def digest(self) -> bytes:
+        return struct.pack(">H", self.value)
+
+
+class Crc32Checksum(Checksum):
+
+    SIZE = 4
+
+    def update(self, data) -> 'Crc32Checksum':
+        self.value = zlib.crc32(data, self.value)
+        return self
+
+    def digest(self) -> bytes:
+        return struct.pack(">L", self.value)
+
+
+CHECKSUMS : dict[str, type[Checksum]] = {
+    'xor': XorChecksum,
+    'crc16': Crc16Checksum,
+    'crc32': Crc32Checksum,
+}
+
+# XOR of every byte in data without a Python-level loop per byte
+def xorBytes(data) -> int:
+    if np is not None:
+        array = np.frombuffer(data, dtype=np.uint8)
+        words = len(array) // 8
+        result = int(np.bitwise_xor.reduce(array[words * 8:]))
+        if words:
+            result ^= foldXor(int(np.bitwise_xor.reduce(array[:words * 8].view(np.uint64))), 64)
+        return result
+
+    return foldXor(int.from_bytes(data, 'little'), len(data) * 8)
+
+# fold an integer in half repeatedly; XOR of the halves keeps the XOR of the bytes
+def foldXor(value : int, bits : int) -> int:
+    while bits > 8:
+        half = (bits // 8 + 1) // 2 * 8
+        value = (value >> half) ^ (value & ((1 << half) - 1))
+        bits = half
+    return value
+
+
+if __name__ == '__main__':
+    # benchmark against the old reduce() implementation on a full-size chunk
+    import os
+    import timeit
+    from functools import reduce
+
+    payload = os.urandom(4096)
+    runs = 2000
+    expected = reduce(lambda a,b: a ^ b, payload)
+    assert XorChecksum.calculate(payload)[0] == expected
+
+    print(f'numpy available: {np is not None}')
+    seconds = timeit.timeit(lambda: reduce(lambda a,b: a ^ b, payload), number=runs)
+    print(f'{"reduce (old)":>14}: {seconds / runs * 1e6:8.2f} us per 4096 byte payload')
+    for name, engine in CHECKSUMS.items():
+        seconds = timeit.timeit(lambda: engine.calculate(payload), number=runs)
+        print(f'{name:>14}: {seconds / runs * 1e6:8.2f} us per 4096 byte payload')
@@ -0,0 +1,117 @@
+import lzma
+import zlib
+
+# Payload compression engines. The engine ID goes into the low bits of the
+# frame's FLAGS byte (see messageCodec.py), 0 meaning uncompressed.
+class Compressor:
+    ID = 0
+
+    @classmethod
+    def compress(cls, payload) -> bytes:
+        raise NotImplementedError
+
+    # raises ValueError if the payload is corrupt or inflates past maxSize
+    @classmethod
+    def decompress(cls, payload, maxSize : int) -> bytes:
+        raise NotImplementedError
+
+# raw deflate: the frame already has a checksum, so the zlib header and adler32 are dropped
+class ZlibCompressor(Compressor):
+    ID = 1
+    LEVEL = 6
+    WBITS = -15
+    ZDICT = b''
+
+    @classmethod
+    def compress(cls, payload) -> bytes:
+        compressor = zlib.compressobj(cls.LEVEL, zlib.DEFLATED, cls.WBITS, zdict=cls.ZDICT) if cls.ZDICT else zlib.compressobj(cls.LEVEL, zlib.DEFLATED, cls.WBITS)
+        return compressor.compress(payload) + compressor.flush()
+
+    @classmethod
+    def decompress(cls, payload, maxSize : int) -> bytes:
+        decompressor = zlib.decompressobj(cls.WBITS, zdict=cls.ZDICT) if cls.ZDICT else zlib.decompressobj(cls.WBITS)
+        try:
+            data = decompressor.decompress(payload, maxSize)
+        except zlib.error as e:
+            raise ValueError(e)
+        if decompressor.unconsumed_tail or not decompressor.eof:
+            raise ValueError(f'payload does not inflate to at most {maxSize} bytes')
+        return data
+
+# raw LZMA2 without the .xz container, which would cost ~60 bytes per message
+class LzmaCompressor(Compressor):
+    ID = 2
+    FILTERS = [{'id': lzma.FILTER_LZMA2, 'preset': 6}]
+
+    @classmethod
+    def compress(cls, payload) -> bytes:
+        return lzma.compress(payload, format=lzma.FORMAT_RAW, filters=cls.FILTERS)
+
+    @classmethod
+    def decompress(cls, payload, maxSize : int) -> bytes:
+        decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_RAW, filters=cls.FILTERS)
+        try:
+            data = decompressor.decompress(payload, maxSize)
+        except lzma.LZMAError as e:
+            raise ValueError(e)
+        if not decompressor.eof:
+            raise ValueError(f'payload does not inflate to at most {maxSize} bytes')
+        return data
+
+# deflate primed with what our telemetry CSV looks like, so even a single
+# short row compresses. Both sides must agree on the dictionary: changing
+# it needs a new ID.
+class CsvCompressor(ZlibCompressor):
+    ID = 3
+    LEVEL = 9
+    ZDICT = (b'timestamp,latitude,longitude,altitude,heading,battery_voltage,satellites,fix\n'
+             b'2025-10-01T00:00:00.000,41.70000,-86.23000,210.0,0.0,12.00,0,0\n'
+             b'2025-10-01T00:00:01.000,41.70001,-86.23001,210.1,90.5,12.50,8,1\n')
+
+COMPRESSORS : dict[int, type[Compressor]] = {
+    compressor.ID : compressor for compressor in (ZlibCompressor, LzmaCompressor, CsvCompressor)
+}
+COMPRESSORS_BY_NAME : dict[str, type[Compressor]] = {
+    'zlib': ZlibCompressor,
+    'lzma': LzmaCompressor,
+    'csv': CsvCompressor,
+}
+
+# Per-topic compression that gives up on payloads that don't shrink.
+# A poor result (e.g. a topic that also carries JPEGs) makes it skip the next
+# few messages without trying, doubling the pause each time it is still poor.
+class AdaptiveCompression:
+
+    # payloads smaller than this are not worth the CPU
+    MIN_SIZE = 64
+    # compressed payloads must be at most this fraction of the original
+    MAX_RATIO = 0.9
+    MAX_BACKOFF = 64
+
+    def __init__(self, compressor : type[Compressor]):
+        self.compressor = compressor
+        self.backoff = 0
+        self.skip = 0
+
+    # returns the payload to send and the engine ID for the FLAGS byte (0 if left alone)
+    def compress(self, payload) -> tuple[bytes, int]:
+        if len(payload) < AdaptiveCompression.MIN_SIZE:
+            return payload, 0
+        if self.skip:
+            self.skip -= 1
+            return payload, 0
+
+        compressed = self.compressor.compress(payload)
+        if len(compressed) > len(payload) * AdaptiveCompression.MAX_RATIO:
+            self.backoff = min(max(1, 2 * self.backoff), AdaptiveCompression.MAX_BACKOFF)
+            self.skip = self.backoff
+            return payload, 0
+
+        self.backoff = 0
+        return compressed, self.compressor.ID
+
+def decompress(compressorID : int, payload, maxSize : int) -> bytes:
+    compressor = COMPRESSORS.get(compressorID)
+    if compressor is None:
+        raise ValueError(f'unknown compression {compressorID}')
+    return compressor.decompress(payload, maxSize)
@@ -9,6 +9,10 @@ class ConcurrentSet:
         with self.lock:
             self.Set.add(messageID)
 
+    def update(self, messageIDs) -> None:
+        with self.lock:
+            self.Set.update(messageIDs)
+
     def __contains__(self, messageID : int) -> bool:
         isContained = False
         with self.lock:
@@ -28,3 +32,10 @@ class ConcurrentSet:
         with self.lock:
             length = len(self.Set)
         return length
+
+    # remove and return everything in the set in one lock acquisition
+    def drain(self) -> set[int]:
+        with self.lock:
+            drained = self.Set
+            self.Set = set()
+        return drained
@@ -0,0 +1,197 @@
+import struct
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from jpegEncoder import JpegEncoder, getEncoder
+
+# Delta-frame video. Every so often a keyframe carries the whole picture; in
+# between only the tiles whose content changed are sent, packed side by side
+# into one small JPEG (a mosaic), so a parked rover watching a site sends a
+# fraction of the bytes of a full frame.
+#
+# PAYLOAD: HEADER | TILE NUMBERS (2 each, row-major, deltas only) | JPEG
+#   HEADER: MAGIC (2) | KIND (1) | FRAME INDEX (2) | BASE INDEX (2) | WIDTH (2) | HEIGHT (2) | TILE SIZE (1) | TILE COUNT (2)
+# A delta only applies on top of the frame with its base index; frames are
+# padded up to whole tiles and WIDTH x HEIGHT is the picture without padding.
+# The base station holds a delta that overtook its base (a retransmitted frame
+# lands late) and asks for a keyframe if the base never shows up.
+MAGIC = b'DF'
+HEADER = struct.Struct(">2sBHHHHBH")
+TILE_NUMBER = np.dtype('>u2')
+KEYFRAME = 0
+DELTA = 1
+INDEX_SPACE = 1 << 16
+
+def isDeltaFrame(buffer) -> bool:
+    return bytes(buffer[:len(MAGIC)]) == MAGIC
+
+# tiles of a frame padded to whole tiles, as (rows, tileSize, columns, tileSize, channels)
+def tileView(frame, tileSize : int):
+    rows, columns = frame.shape[0] // tileSize, frame.shape[1] // tileSize
+    return frame.reshape(rows, tileSize, columns, tileSize, -1)
+
+class DeltaEncoder:
+
+    TILE_SIZE=16
+    # mean absolute difference per pixel and channel for a tile to count as changed
+    THRESHOLD=6.0
+    # seconds between keyframes, so a base station that lost one catches up
+    # even if it never asks; counted in time so a still scene still gets them
+    KEYFRAME_INTERVAL=15.0
+    # above this fraction of changed tiles a keyframe is about as cheap
+    MAX_CHANGED=0.5
+    MOSAIC_COLUMNS=32
+
+    def __init__(self, tileSize : int=TILE_SIZE, threshold : float=THRESHOLD, keyframeInterval : float=KEYFRAME_INTERVAL, encoder : JpegEncoder=None):
+        self.tileSize = tileSize
+        self.threshold = threshold
+        self.keyframeInterval = keyframeInterval
+        self.encoder = encoder if encoder is not None else getEncoder()
+        # the frame as the base station has it (before JPEG losses), padded to whole tiles
+        self.reference = None
+        self.frameIndex = INDEX_SPACE - 1
+        self.lastKeyframe = 0.0
+
+    def requestKeyframe(self) -> None:
+        self.reference = None
+
+    def pad(self, frame):
+        height, width = frame.shape[:2]
+        padHeight, padWidth = -height % self.tileSize, -width % self.tileSize
+        if not padHeight and not padWidth:
+            return np.ascontiguousarray(frame)
+        return np.pad(frame, ((0, padHeight), (0, padWidth), (0, 0)), mode='edge')
+
+    # returns (payload, whether it is a keyframe); payload is None if nothing changed
+    def encode(self, frame, quality : int) -> tuple[bytes, bool]:
+        height, width = frame.shape[:2]
+        padded = self.pad(frame)
+        if self.reference is None or self.reference.shape != padded.shape or time.time() - self.lastKeyframe >= self.keyframeInterval:
+            return self.keyframe(padded, width, height, quality), True
+
+        tiles = tileView(padded, self.tileSize)
+        referenceTiles = tileView(self.reference, self.tileSize)
+        difference = np.abs(tiles.astype(np.int16) - referenceTiles).mean(axis=(1, 3, 4))
+        changed = np.flatnonzero(difference > self.threshold)
+        if not len(changed):
+            return None, False
+        if len(changed) > DeltaEncoder.MAX_CHANGED * difference.size:
+            return self.keyframe(padded, width, height, quality), True
+
+        rows, columns = np.divmod(changed, difference.shape[1])
+        # (tile count, tileSize, tileSize, channels)
+        changedTiles = tiles[rows, :, columns]
+        referenceTiles[rows, :, columns] = changedTiles
+
+        base = self.frameIndex
+        self.frameIndex = (self.frameIndex + 1) % INDEX_SPACE
+        header = HEADER.pack(MAGIC, DELTA, self.frameIndex, base, width, height, self.tileSize, len(changed))
+        return header + changed.astype(TILE_NUMBER).tobytes() + self.encoder.encode(self.mosaic(changedTiles), quality), False
+
+    def keyframe(self, padded, width : int, height : int, quality : int) -> bytes:
+        self.reference = padded.copy()
+        self.frameIndex = (self.frameIndex + 1) % INDEX_SPACE
+        self.lastKeyframe = time.time()
+        header = HEADER.pack(MAGIC, KEYFRAME, self.frameIndex, self.frameIndex, width, height, self.tileSize, 0)
+        return header + self.encoder.encode(padded, quality)
+
+    # lay the tiles out row-major in a grid MOSAIC_COLUMNS wide
+    def mosaic(self, tiles):
+        count, size = tiles.shape[0], self.tileSize
+        columns = min(count, DeltaEncoder.MOSAIC_COLUMNS)
+        rows = -(-count // columns)
+        grid = np.zeros((rows * columns, size, size, tiles.shape[3]), dtype=tiles.dtype)
+        grid[:count] = tiles
+        return np.ascontiguousarray(grid.reshape(rows, columns, size, size, -1).transpose(0, 2, 1, 3, 4).reshape(rows * size, columns * size, -1))
+
+# Rebuilds frames from keyframes and deltas on the base station. A delta whose
+# base frame hasn't arrived yet waits for it, since a retransmitted frame
+# often lands after the one that follows it. If the base still hasn't come
+# after MAX_WAIT (or too many deltas pile up), it was lost for good: the
+# waiting deltas are dropped and requestKeyframe is called.
+class DeltaCompositor:
+
+    # deltas held back waiting for their base
+    MAX_PENDING=8
+    # seconds a delta may wait for its base
+    MAX_WAIT=10.0
+    # seconds between keyframe requests, the rover needs a round trip to answer
+    REQUEST_INTERVAL=5.0
+
+    # requestKeyframe: callable() that asks the rover for a keyframe, optional
+    def __init__(self, requestKeyframe=None):
+        self.frame = None
+        self.frameIndex : int = None
+        self.requestKeyframe = requestKeyframe
+        # base index -> (arrival time, payload), oldest first
+        self.pending : OrderedDict[int, tuple[float, bytes]] = OrderedDict()
+        self.lastRequest = 0.0
+
+    # returns the full frames the payload completes, oldest first: none if it has
+    # to wait for its base, several if it was the base others were waiting for
+    def apply(self, buffer) -> list:
+        magic, kind, frameIndex, base, width, height, tileSize, count = HEADER.unpack_from(buffer)
+        frames = []
+        if kind == KEYFRAME:
+            # deltas on anything before this keyframe are of no use any more
+            waiting = self.pending.pop(frameIndex, None)
+            self.pending.clear()
+            if waiting is not None:
+                self.pending[frameIndex] = waiting
+        elif self.frame is None or self.frameIndex != base:
+            self.hold(base, buffer)
+            return frames
+
+        while buffer is not None:
+            frame = self.decode(buffer)
+            if frame is not None:
+                frames.append(frame.copy())
+            waiting = self.pending.pop(self.frameIndex, None) if frame is not None else None
+            buffer = waiting[1] if waiting is not None else None
+        return frames
+
+    def hold(self, base : int, buffer) -> None:
+        # its base was applied or skipped over already: a stale copy
+        if self.frameIndex is not None and (self.frameIndex - base) % INDEX_SPACE < INDEX_SPACE // 2:
+            return
+        now = time.time()
+        self.pending[base] = (now, bytes(buffer))
+        waited = now - next(iter(self.pending.values()))[0]
+        if self.frame is not None and len(self.pending) <= DeltaCompositor.MAX_PENDING and waited < DeltaCompositor.MAX_WAIT:
+            return
+
+        # the base is lost for good (or there never was a keyframe), start over from a keyframe
+        self.pending.clear()
+        if now - self.lastRequest < DeltaCompositor.REQUEST_INTERVAL:
+            return
+        self.lastRequest = now
+        print(f'--Error: video frame {base} is missing a base frame, asking for a keyframe.')
+        if self.requestKeyframe is not None:
+            self.requestKeyframe()
+
+    # applies one keyframe or delta on top of self.frame; returns the visible frame or None
+    def decode(self, buffer):
+        magic, kind, frameIndex, base, width, height, tileSize, count = HEADER.unpack_from(buffer)
+        tileNumbers = np.frombuffer(buffer, TILE_NUMBER, count, HEADER.size).astype(np.intp)
+        image = cv2.imdecode(np.frombuffer(buffer, np.uint8, offset=HEADER.size + count * TILE_NUMBER.itemsize), cv2.IMREAD_COLOR)
+        if image is None:
+            print(f'--Error: could not decode video frame {frameIndex}.')
+            return None
+
+        if kind == KEYFRAME:
+            self.frame = image
+            self.frameIndex = frameIndex
+            return self.frame[:height, :width]
+
+        if (image.shape[1] // tileSize) * (image.shape[0] // tileSize) < count:
+            print(f'--Error: video frame {frameIndex} holds fewer tiles than it lists.')
+            return None
+        rows, columns = np.divmod(tileNumbers, self.frame.shape[1] // tileSize)
+        # cut the mosaic back into (tile count, tileSize, tileSize, channels)
+        tiles = tileView(image, tileSize).transpose(0, 2, 1, 3, 4).reshape(-1, tileSize, tileSize, image.shape[2])[:count]
+        tileView(self.frame, tileSize)[rows, :, columns] = tiles
+        self.frameIndex = frameIndex
+        return self.frame[:height, :width]
@@ -0,0 +1,58 @@
+import threading
+
+from message import Message
+
+# Fixed-size replacement for a set of every message ID ever processed.
+# Remembers the highest ID seen and a bitmap of the windowSize IDs below it,
+# comparing IDs with serial number arithmetic so wraparound at 65535 is safe.
+#
+# IDs are only compared within one session of the sender (see messageCodec.py):
+# a new session means the other side restarted, so the window starts over.
+# Within a session an ID further behind than the window can only be a late
+# retransmission, so it counts as a duplicate.
+class DuplicateDetector:
+
+    def __init__(self, windowSize : int=1024):
+        self.windowSize = windowSize
+        self.mask = (1 << windowSize) - 1
+        self.session : int = None
+        self.highest : int = None
+        # bit i set = ID (highest - i) was seen
+        self.bitmap : int = 0
+        self.lock = threading.Lock()
+
+    # how far messageID is ahead of the highest ID seen (negative if behind)
+    def distance(self, messageID : int) -> int:
+        difference = (messageID - self.highest) % Message.ID_SPACE
+        if difference >= Message.ID_SPACE // 2:
+            difference -= Message.ID_SPACE
+        return difference
+
+    def isDuplicate(self, messageID : int, session : int) -> bool:
+        with self.lock:
+            if self.highest is None or session != self.session:
+                return False
+            distance = self.distance(messageID)
+            if distance > 0:
+                return False
+            if -distance >= self.windowSize:
+                return True
+            return bool(self.bitmap >> -distance & 1)
+
+    def add(self, messageID : int, session : int) -> None:
+        with self.lock:
+            if self.highest is None or session != self.session:
+                self.reset(messageID, session)
+                return
+
+            distance = self.distance(messageID)
+            if distance > 0:
+                self.bitmap = (self.bitmap << distance | 1) & self.mask
+                self.highest = messageID
+            elif -distance < self.windowSize:
+                self.bitmap |= 1 << -distance
+
+    def reset(self, messageID : int, session : int) -> None:
+        self.session = session
+        self.highest = messageID
+        self.bitmap = 1
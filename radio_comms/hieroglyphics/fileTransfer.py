@@ -0,0 +1,464 @@
+import glob
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from message import Message
+from scheduler import Scheduler
+
+# Resumable file transfers, carried by FILE_CONTENTS messages whose number
+# says what the payload holds:
+#   OFFER  sender -> receiver: transfer ID, size, chunk size, sha256, then the file name
+#   NEED   receiver -> sender: transfer ID, then runs of chunks it is still missing
+#   DATA   sender -> receiver: transfer ID, offset, then the chunk
+#   DONE   receiver -> sender: transfer ID and whether the hash matched
+# The sender mmaps the file and only sends the chunks the receiver asks for.
+# The receiver writes every chunk straight to its offset in a preallocated
+# <name>.part file and keeps a bitmap of what arrived in <name>.part.progress,
+# so offering the same file again after the link dropped (or either side
+# restarted) only moves the chunks that never made it. The sender hashes a
+# file on a worker thread before offering it, and forgets transfers nobody
+# asked about for OUTGOING_TIMEOUT; offering the file again picks them back up.
+# REQUEST_FILE messages ask the other side for files, their number again says what for:
+#   FETCH  offset, length, then a path or glob; every matching file is offered
+#   LIST   a directory or glob, answered by LISTING pieces (FILE_CONTENTS)
+class FileTransfer:
+
+    OFFER=1
+    DATA=2
+    NEED=3
+    DONE=4
+    LISTING=5
+    # kinds of REQUEST_FILE message
+    FETCH=1
+    LIST=2
+
+    OFFER_HEADER = struct.Struct(">HQL32s")
+    DATA_HEADER = struct.Struct(">HQ")
+    TRANSFER_ID = struct.Struct(">H")
+    # (first chunk, count) per run of missing chunks
+    CHUNK_RANGE = struct.Struct(">LL")
+    DONE_PAYLOAD = struct.Struct(">H?")
+    # the progress file starts with the offer it belongs to, then the bitmap
+    PROGRESS_HEADER = struct.Struct(">QL32s")
+    # chunks written between saves of the progress bitmap
+    SAVE_EVERY = 32
+    # negative offsets count from the end of the file, length 0 means up to the end
+    FETCH_HEADER = struct.Struct(">qQ")
+    # listing ID and whether this is the last piece, then lines of text
+    LISTING_HEADER = struct.Struct(">H?")
+    # most files one FETCH may start at once
+    MAX_FILES_PER_REQUEST = 16
+    # bytes hashed at a time, between which an outgoing transfer can be closed
+    HASH_BLOCK = 1 << 20
+    # seconds without a request for chunks after which an outgoing transfer is closed
+    OUTGOING_TIMEOUT = 600
+
+    class Outgoing:
+        # offset, length: send only this part of the file; a negative offset
+        # counts from the end and length 0 means up to the end
+        def __init__(self, transfer_id : int, path : str, chunk_size : int, offset : int=0, length : int=0):
+            self.transfer_id = transfer_id
+            self.path = path
+            self.chunk_size = chunk_size
+            self.file = open(path, 'rb')
+            file_size = os.fstat(self.file.fileno()).st_size
+            start = max(0, file_size + offset) if offset < 0 else min(offset, file_size)
+            end = min(start + length, file_size) if length else file_size
+            self.range = (start, end)
+            self.size = end - start
+            self.chunk_count = -(-self.size // chunk_size)
+            # an empty file cannot be mapped
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if file_size else None
+            self.mapView = memoryview(self.map if self.map is not None else b'')
+            self.view = self.mapView[start:end]
+            # set by hash()
+            self.digest : bytes = None
+            # chunks are cut on the scheduler thread, the transfer is closed on the processing thread
+            self.lock = threading.Lock()
+            self.closed = False
+            self.lastActivity = time.time()
+
+        # a block at a time, so close() never waits on the whole file; False if closed meanwhile
+        def hash(self) -> bool:
+            sha256 = hashlib.sha256()
+            for offset in range(0, self.size, FileTransfer.HASH_BLOCK):
+                with self.lock:
+                    if self.closed:
+                        return False
+                    with self.view[offset:offset + FileTransfer.HASH_BLOCK] as block:
+                        sha256.update(block)
+            self.digest = sha256.digest()
+            return True
+
+        def isExpired(self, now : float) -> bool:
+            return now - self.lastActivity > FileTransfer.OUTGOING_TIMEOUT
+
+        # what the receiver saves it as: the file name, plus the byte range if it is only part of it
+        def name(self) -> str:
+            name = os.path.basename(self.path)
+            if self.size == os.fstat(self.file.fileno()).st_size:
+                return name
+            return f'{name}.{self.range[0]}-{self.range[1]}'
+
+        def offer(self, name : str) -> Message:
+            header = FileTransfer.OFFER_HEADER.pack(self.transfer_id, self.size, self.chunk_size, self.digest)
+            return Message(purpose=Message.Purpose.FILE_CONTENTS, number=FileTransfer.OFFER, payload=header + name.encode())
+
+        # the DATA payload for one chunk, copied out of the map; None once closed
+        def chunk(self, index : int) -> bytes:
+            with self.lock:
+                if self.closed:
+                    return None
+                self.lastActivity = time.time()
+                offset = index * self.chunk_size
+                return FileTransfer.DATA_HEADER.pack(self.transfer_id, offset) + self.view[offset:offset + self.chunk_size]
+
+        # lazily cut the requested chunks, see Scheduler.addListOfMessages
+        def chunks(self, ranges : list[range]):
+            for chunk_range in ranges:
+                for index in chunk_range:
+                    if index >= self.chunk_count:
+                        break
+                    payload = self.chunk(index)
+                    if payload is None:
+                        return
+                    yield Message(purpose=Message.Purpose.FILE_CONTENTS, number=FileTransfer.DATA, payload=payload)
+
+        def close(self) -> None:
+            with self.lock:
+                if self.closed:
+                    return
+                self.closed = True
+                self.view.release()
+                self.mapView.release()
+                if self.map is not None:
+                    self.map.close()
+                self.file.close()
+
+    class Incoming:
+        def __init__(self, path : str, size : int, chunk_size : int, digest : bytes):
+            self.path = path
+            self.partPath = f'{path}.part'
+            self.progressPath = f'{path}.part.progress'
+            self.size = size
+            self.chunk_size = chunk_size
+            self.digest = digest
+            self.chunk_count = -(-size // chunk_size)
+            self.header = FileTransfer.PROGRESS_HEADER.pack(size, chunk_size, digest)
+            # one bit per chunk, set once it is on disk
+            self.received = self.loadProgress()
+            if self.received is None:
+                self.received = bytearray((self.chunk_count + 7) // 8)
+            self.remaining = self.chunk_count - sum(bin(byte).count('1') for byte in self.received)
+            self.unsaved = 0
+            self.fd = os.open(self.partPath, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+            # preallocate, so every chunk can be written in place as it arrives
+            os.ftruncate(self.fd, size)
+
+        # the bitmap of an earlier attempt at the same file, if there was one
+        def loadProgress(self) -> bytearray:
+            try:
+                with open(self.progressPath, 'rb') as f:
+                    progress = f.read()
+            except OSError:
+                return None
+            if not os.path.exists(self.partPath) or progress[:len(self.header)] != self.header:
+                return None
+            received = bytearray(progress[len(self.header):])
+            if len(received) != (self.chunk_count + 7) // 8:
+                return None
+            return received
+
+        def saveProgress(self) -> None:
+            temporary = f'{self.progressPath}.tmp'
+            with open(temporary, 'wb') as f:
+                f.write(self.header)
+                f.write(self.received)
+            os.replace(temporary, self.progressPath)
+            self.unsaved = 0
+
+        def hasChunk(self, index : int) -> bool:
+            return bool(self.received[index >> 3] & (1 << (index & 7)))
+
+        def missingRanges(self) -> list[range]:
+            ranges = []
+            first = None
+            for index in range(self.chunk_count):
+                if self.hasChunk(index):
+                    if first is not None:
+                        ranges.append(range(first, index))
+                        first = None
+                elif first is None:
+                    first = index
+            if first is not None:
+                ranges.append(range(first, self.chunk_count))
+            return ranges
+
+        # returns False if the chunk was already written
+        def write(self, offset : int, data : memoryview) -> bool:
+            index = offset // self.chunk_size
+            if self.hasChunk(index):
+                return False
+            if hasattr(os, 'pwrite'):
+                os.pwrite(self.fd, data, offset)
+            else:
+                os.lseek(self.fd, offset, os.SEEK_SET)
+                os.write(self.fd, data)
+            self.received[index >> 3] |= 1 << (index & 7)
+            self.remaining -= 1
+            self.unsaved += 1
+            if self.unsaved >= FileTransfer.SAVE_EVERY:
+                self.saveProgress()
+            return True
+
+        def verify(self) -> bool:
+            if not self.size:
+                return hashlib.sha256().digest() == self.digest
+            with mmap.mmap(self.fd, 0, access=mmap.ACCESS_READ) as contents:
+                return hashlib.sha256(contents).digest() == self.digest
+
+        # forget everything received so far, e.g. after a hash mismatch
+        def reset(self) -> None:
+            self.received = bytearray(len(self.received))
+            self.remaining = self.chunk_count
+            self.saveProgress()
+
+        def finish(self) -> None:
+            os.close(self.fd)
+            os.replace(self.partPath, self.path)
+            if os.path.exists(self.progressPath):
+                os.remove(self.progressPath)
+
+        def close(self) -> None:
+            self.saveProgress()
+            os.close(self.fd)
+
+    # topic: where this side queues its offers, chunks and replies
+    # directory: where received files are written
+    def __init__(self, scheduler : Scheduler, topic : str='all', directory : str='.'):
+        self.scheduler = scheduler
+        self.topic = topic
+        self.directory = directory
+        self.outgoing : dict[int, FileTransfer.Outgoing] = {}
+        self.incoming : dict[int, FileTransfer.Incoming] = {}
+        self.lock = threading.Lock()
+        # hashes files before they are offered, off the message processing thread
+        self.hasher = ThreadPoolExecutor(max_workers=1)
+
+    # offer a file (or a byte range of it, see Outgoing) to the other side once
+    # it is hashed; it asks for the chunks it needs
+    def sendFile(self, path : str, offset : int=0, length : int=0) -> int:
+        self.expireOutgoing()
+        transfer_id = Message.next_transfer_id()
+        outgoing = FileTransfer.Outgoing(transfer_id, path, self.scheduler.chunkSize(), offset, length)
+        with self.lock:
+            # offering a file again supersedes the earlier, interrupted offer
+            for old_id, old in list(self.outgoing.items()):
+                if old.path == path and old.range == outgoing.range:
+                    old.close()
+                    del self.outgoing[old_id]
+            self.outgoing[transfer_id] = outgoing
+        self.hasher.submit(self.offer, outgoing)
+        return transfer_id
+
+    # runs on the hasher thread
+    def offer(self, outgoing : 'FileTransfer.Outgoing') -> None:
+        try:
+            if not outgoing.hash():
+                return
+        except Exception as e:
+            print(f'--Error: could not hash {outgoing.path}: {e}')
+            return
+        outgoing.lastActivity = time.time()
+        self.scheduler.addMessage(outgoing.offer(outgoing.name()), self.topic)
+        print(f'offering file {outgoing.path} ({outgoing.size} bytes) as transfer {outgoing.transfer_id}')
+
+    # close outgoing transfers the other side stopped asking about, e.g. abandoned pulls
+    def expireOutgoing(self) -> None:
+        now = time.time()
+        with self.lock:
+            expired = [transfer_id for transfer_id, outgoing in self.outgoing.items() if outgoing.isExpired(now)]
+            closing = [self.outgoing.pop(transfer_id) for transfer_id in expired]
+        for outgoing in closing:
+            outgoing.close()
+            print(f'file transfer {outgoing.transfer_id} of {outgoing.path} expired.')
+
+    def handleMessage(self, message : Message) -> None:
+        self.expireOutgoing()
+        if message.number == FileTransfer.OFFER:
+            self.handleOffer(message)
+        elif message.number == FileTransfer.DATA:
+            self.handleData(message)
+        elif message.number == FileTransfer.NEED:
+            self.handleNeed(message)
+        elif message.number == FileTransfer.DONE:
+            self.handleDone(message)
+        elif message.number == FileTransfer.LISTING:
+            self.handleListing(message)
+        else:
+            print(f'--Error: file transfer message of unknown kind {message.number}.')
+
+    @staticmethod
+    def fetchRequest(pattern : str, offset : int=0, length : int=0) -> Message:
+        return Message(purpose=Message.Purpose.REQUEST_FILE, number=FileTransfer.FETCH, payload=FileTransfer.FETCH_HEADER.pack(offset, length) + pattern.encode())
+
+    @staticmethod
+    def listRequest(pattern : str) -> Message:
+        return Message(purpose=Message.Purpose.REQUEST_FILE, number=FileTransfer.LIST, payload=pattern.encode())
+
+    # answer a REQUEST_FILE; every file it matches becomes its own transfer,
+    # and the scheduler interleaves their chunks on the topic.
+    # returns an error string for the requester, or None
+    def handleRequest(self, message : Message) -> str:
+        payload = message.get_payload()
+        if message.number == FileTransfer.LIST:
+            return self.sendListing(bytes(payload).decode())
+        if message.number != FileTransfer.FETCH:
+            return f'--Error: file request of unknown kind {message.number}.'
+
+        offset, length = FileTransfer.FETCH_HEADER.unpack_from(payload)
+        pattern = bytes(payload[FileTransfer.FETCH_HEADER.size:]).decode()
+        paths = [path for path in sorted(glob.glob(os.path.expanduser(pattern))) if os.path.isfile(path)]
+        if not paths:
+            return f'--Error: no file matches {pattern}.'
+
+        # a file that can't be opened doesn't stop the others
+        errors = []
+        for path in paths[:FileTransfer.MAX_FILES_PER_REQUEST]:
+            try:
+                self.sendFile(path, offset, length)
+            except OSError as e:
+                errors.append(f'--Error: could not send {path}: {e}')
+        if len(paths) > FileTransfer.MAX_FILES_PER_REQUEST:
+            errors.append(f'--Error: {pattern} matches {len(paths)} files, only sending the first {FileTransfer.MAX_FILES_PER_REQUEST}.')
+        return '\n'.join(errors) or None
+
+    # one line per entry, "size  path", directories end in a slash;
+    # cut at line boundaries into pieces that fit in a chunk
+    def sendListing(self, pattern : str) -> str:
+        expanded = os.path.expanduser(pattern or '.')
+        if os.path.isdir(expanded):
+            paths = [os.path.join(expanded, entry) for entry in sorted(os.listdir(expanded))]
+        else:
+            paths = sorted(glob.glob(expanded))
+        if not paths:
+            return f'--Error: nothing matches {pattern}.'
+
+        listing_id = Message.next_transfer_id()
+        room = self.scheduler.chunkSize() - FileTransfer.LISTING_HEADER.size
+        pieces = [bytearray()]
+        for path in paths:
+            if os.path.isdir(path):
+                line = f'{"-":>12}  {path}/\n'.encode()
+            else:
+                try:
+                    line = f'{os.path.getsize(path):>12}  {path}\n'.encode()
+                except OSError:
+                    continue
+            if pieces[-1] and len(pieces[-1]) + len(line) > room:
+                pieces.append(bytearray())
+            pieces[-1] += line
+
+        self.scheduler.addListOfMessages([Message(purpose=Message.Purpose.FILE_CONTENTS, number=FileTransfer.LISTING,
+                                                  payload=FileTransfer.LISTING_HEADER.pack(listing_id, index == len(pieces) - 1) + piece)
+                                          for index, piece in enumerate(pieces)], self.topic)
+        return None
+
+    def handleListing(self, message : Message) -> None:
+        payload = message.get_payload()
+        listing_id, last = FileTransfer.LISTING_HEADER.unpack_from(payload)
+        print(bytes(payload[FileTransfer.LISTING_HEADER.size:]).decode(errors='replace'), end='')
+        if last:
+            print(f'(end of listing {listing_id})')
+
+    def handleOffer(self, message : Message) -> None:
+        payload = message.get_payload()
+        transfer_id, size, chunk_size, digest = FileTransfer.OFFER_HEADER.unpack_from(payload)
+        # never write outside the receiving directory
+        name = os.path.basename(bytes(payload[FileTransfer.OFFER_HEADER.size:]).decode())
+        if not name or not chunk_size:
+            print(f'--Error: malformed offer for transfer {transfer_id}.')
+            return
+        path = os.path.join(self.directory, name)
+
+        with self.lock:
+            # an offer of a file that is still coming in replaces the old transfer
+            for old_id, old in list(self.incoming.items()):
+                if old_id == transfer_id or old.path == path:
+                    old.close()
+                    del self.incoming[old_id]
+            incoming = FileTransfer.Incoming(path, size, chunk_size, digest)
+            self.incoming[transfer_id] = incoming
+
+        if incoming.remaining < incoming.chunk_count:
+            print(f'resuming file {name}: {incoming.chunk_count - incoming.remaining} of {incoming.chunk_count} chunks already received')
+        else:
+            print(f'receiving file {name} ({size} bytes)')
+
+        if incoming.remaining:
+            self.requestChunks(transfer_id, incoming.missingRanges())
+        else:
+            self.completeTransfer(transfer_id, incoming)
+
+    def handleData(self, message : Message) -> None:
+        payload = message.get_payload()
+        header_size = FileTransfer.DATA_HEADER.size
+        transfer_id, offset = FileTransfer.DATA_HEADER.unpack_from(payload)
+        data = memoryview(payload)[header_size:]
+
+        with self.lock:
+            incoming = self.incoming.get(transfer_id)
+            if incoming is None:
+                return
+            if offset % incoming.chunk_size or len(data) != min(incoming.chunk_size, incoming.size - offset):
+                print(f'--Error: chunk at offset {offset} of file transfer {transfer_id} does not fit.')
+                return
+            if not incoming.write(offset, data) or incoming.remaining:
+                return
+
+        self.completeTransfer(transfer_id, incoming)
+
+    def handleNeed(self, message : Message) -> None:
+        payload = message.get_payload()
+        transfer_id, = FileTransfer.TRANSFER_ID.unpack_from(payload)
+        ranges = [range(first, first + count) for first, count in FileTransfer.CHUNK_RANGE.iter_unpack(payload[FileTransfer.TRANSFER_ID.size:])]
+        with self.lock:
+            outgoing = self.outgoing.get(transfer_id)
+        if outgoing is None:
+            print(f'--Error: chunks requested for unknown file transfer {transfer_id}.')
+            return
+        outgoing.lastActivity = time.time()
+        self.scheduler.addListOfMessages(outgoing.chunks(ranges), self.topic)
+
+    def handleDone(self, message : Message) -> None:
+        transfer_id, ok = FileTransfer.DONE_PAYLOAD.unpack(message.get_payload())
+        with self.lock:
+            outgoing = self.outgoing.pop(transfer_id, None)
+        if outgoing is not None:
+            outgoing.close()
+        print(f'file transfer {transfer_id} {"completed" if ok else "failed"}.')
+
+    def completeTransfer(self, transfer_id : int, incoming : 'FileTransfer.Incoming') -> None:
+        if not incoming.verify():
+            print(f'--Error: hash mismatch for file {incoming.path}, receiving it again.')
+            incoming.reset()
+            self.requestChunks(transfer_id, incoming.missingRanges())
+            return
+
+        with self.lock:
+            self.incoming.pop(transfer_id, None)
+        incoming.finish()
+        print(f'file {incoming.path} received.')
+        self.scheduler.addMessage(Message(purpose=Message.Purpose.FILE_CONTENTS, number=FileTransfer.DONE, payload=FileTransfer.DONE_PAYLOAD.pack(transfer_id, True)), self.topic)
+
+    # ask for missing chunks, as many runs per message as fit in a chunk
+    def requestChunks(self, transfer_id : int, ranges : list[range]) -> None:
+        per_message = max(1, self.scheduler.chunkSize() // FileTransfer.CHUNK_RANGE.size)
+        for start in range(0, len(ranges), per_message):
+            payload = FileTransfer.TRANSFER_ID.pack(transfer_id) + b''.join(FileTransfer.CHUNK_RANGE.pack(r.start, len(r)) for r in ranges[start:start + per_message])
+            self.scheduler.addMessage(Message(purpose=Message.Purpose.FILE_CONTENTS, number=FileTransfer.NEED, payload=payload), self.topic)
@@ -1,37 +1,58 @@
 import cv2
 
+from cameraManager import CameraManager
+from jpegEncoder import JpegEncoder, getEncoder
+
 class ImageCapturer:
 
+    # cameraPaths: one camera or a list of them (see CameraManager), which are opened on first use
     def __init__(self, cameraPaths):
         self.cameraPaths = cameraPaths
-        self.cap = cv2.VideoCapture(0)
-        self.running = False
-
-    def isTakingVideo(self):
-        return self.running
-
-    def stopTakingVideo(self):
-        self.running = False
-
-    def startTakingVideo(self):
-        self.running = True
+        self.cameras = CameraManager(cameraPaths)
+        # the camera video and photos come from unless asked otherwise
+        self.cameraIndex = 0
 
+    # the camera stays open in the pool, so switching back and forth is immediate
     def changeCamera(self, cameraIndex : int):
-        self.cap = cv2.VideoCapture(self.cameraPaths[cameraIndex])
-
-    def captureImage(self, quality : int, resize_width : int=None) -> tuple[int, bytearray]:
-        ret, frame = self.cap.read() 
-
-        if not ret:
+        self.cameras.camera(cameraIndex)
+        self.cameraIndex = cameraIndex
+
+    # open the current camera and keep grabbing, so photos and video always get the current scene
+    def startCapturing(self) -> None:
+        self.cameras.camera(self.cameraIndex)
+
+    def stopCapturing(self) -> None:
+        self.cameras.close()
+
+    # (frame number, frame) of the newest frame of a camera (by default the current one)
+    # newer than `after`; (after, None) on timeout. Numbers increase across cameras.
+    # timeout, openTimeout: see CameraManager.Camera.getLatestFrame
+    def getLatestFrame(self, after : int=-1, timeout : float=None, cameraIndex : int=None, openTimeout : float=None):
+        if cameraIndex is None:
+            cameraIndex = self.cameraIndex
+        return self.cameras.getLatestFrame(cameraIndex, after, timeout, openTimeout)
+
+    def captureImage(self, quality : int, resize_width : int=None, cameraIndex : int=None) -> tuple[int, memoryview]:
+        _, frame = self.getLatestFrame(cameraIndex=cameraIndex)
+        if frame is None:
             return 0, None
 
-        if resize_width:
-            resize_factor = resize_width / frame.shape[1]
-            frame = cv2.resize(frame, (resize_width, int(resize_factor * frame.shape[0])))
-
-        encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
-        encoded, buffer = cv2.imencode('.jpg', frame, encode_param) 
-
+        buffer = ImageCapturer.encodeImage(frame, quality, resize_width)
         size_of_data = len(buffer)
         return size_of_data, buffer
 
+    # encoder: see jpegEncoder.py, by default the fastest one installed
+    @staticmethod
+    def encodeImage(frame, quality : int, resize_width : int=None, encoder : JpegEncoder=None) -> memoryview:
+        frame = ImageCapturer.resizeImage(frame, resize_width)
+        if encoder is None:
+            encoder = getEncoder()
+        return encoder.encode(frame, quality)
+
+    # scaled to resize_width keeping the aspect ratio, or as it is
+    @staticmethod
+    def resizeImage(frame, resize_width : int=None):
+        if not resize_width:
+            return frame
+        resize_factor = resize_width / frame.shape[1]
+        return cv2.resize(frame, (resize_width, int(resize_factor * frame.shape[0])))
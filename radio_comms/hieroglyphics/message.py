@@ -1,22 +1,27 @@
 # Authors: Henry Jochaniewicz
 # Date last modified: October 8, 2025
 
-from functools import reduce
+import random
 import serial
 import struct
 import sys
+import threading
 from datetime import datetime
 from enum import IntEnum
 
-### MESSAGE STRUCTURE:
-    # UID: 2 BYTES?
-    # PURPOSE: 1 BYTE?
-    # SIZE OF PAYLOAD: 4 BYTES?
-    # PAYLOAD: VARIABLE BYTES?
-    # CHECKSUM: 1 BIT
+from checksum import XorChecksum
+from messageCodec import MessageCodec
+
+### MESSAGE STRUCTURE: see messageCodec.py for the frame layout
 class Message:
 
-    message_count = 0
+    # IDs are packed as ">H" and wrap around; see duplicateDetector.py
+    ID_SPACE = 1 << 16
+    # a random start keeps stray acknowledgments from before a restart off the new IDs
+    message_count = random.randrange(ID_SPACE)
+    message_count_lock = threading.Lock()
+    # SESSION byte of every frame this process sends, see messageCodec.py
+    SESSION = random.randrange(256)
 
     class Purpose(IntEnum):
         ACK=0
@@ -31,32 +36,55 @@ class Message:
         CAMERA_VISION=9
         FILE_CONTENTS=10
         REQUEST_FILE=11
+        ACK_BATCH=12
+
+    # (first ID, count) per run of consecutive acknowledged IDs
+    ID_RANGE = struct.Struct(">HH")
+
+    # random like message_count; reassembler.py also keys transfers by session
+    transfer_count = random.randrange(ID_SPACE)
+    # starts every chunk of a transfer: transfer ID, total size, chunk size, offset of this chunk
+    CHUNK_HEADER = struct.Struct(">HLHL")
+    CHUNK_SIZE = 4096
 
     # I am necessitating that the payload ALREADY BE a byte object.
     # I do not know how big it is.
     def __init__(self, new=True, purpose: int=0, payload : bytes=None, number : int=0):
         if new:
-            self.msg_id : int = Message.message_count
-            Message.message_count += 1
+            self.msg_id : int = Message.next_id()
         else:
             self.msg_id : int = -1
 
         self.purpose : int = purpose
         self.number : int = number
         self.payload : bytes = payload
+        # FLAGS byte of the frame, see messageCodec.py
+        self.flags : int = 0
+        self.session : int = Message.SESSION
         if payload is not None:
             self.size_of_payload : int = len(payload)
             #self.checksum : bytes = self.calculate_checksum(payload)
 
     # converting a given bytestring into its corresponding Message counterpart
     def convert_from_bytestring(self, bytestring : bytes):
-        self.msg_id = struct.unpack(">H", bytestring[0:2])[0]
-        self.purpose = struct.unpack(">B", bytestring[2])[0]
-        self.number = struct.unpack(">B", bytestring[3])[0]
-        self.size_of_payload = struct.unpack(">L", bytestring[4:8])[0]
-        self.payload = bytestring[8:-1]
+        self.msg_id, self.purpose, self.number, self.size_of_payload, self.flags, self.session = MessageCodec.decodeHeader(bytestring)
+        self.payload = bytestring[MessageCodec.HEADER_SIZE:-XorChecksum.SIZE]
         self.checksum = bytestring[-1]
 
+    @staticmethod
+    def next_id() -> int:
+        with Message.message_count_lock:
+            msg_id = Message.message_count
+            Message.message_count = (Message.message_count + 1) % Message.ID_SPACE
+        return msg_id
+
+    @staticmethod
+    def next_transfer_id() -> int:
+        with Message.message_count_lock:
+            transfer_id = Message.transfer_count
+            Message.transfer_count = (Message.transfer_count + 1) % Message.ID_SPACE
+        return transfer_id
+
     def set_msg_id(self, id):
         # if type(id) is bytes:
         #     self.msg_id = struct.unpack(">H", id)[0]
@@ -69,12 +97,7 @@ class Message:
     def get_as_bytes(self) -> bytes:
         # if not self:
         #     return None
-        b_id = struct.pack(">H", self.msg_id)
-        b_purpose = struct.pack(">B", int(self.purpose))
-        b_number = struct.pack(">B", self.number)
-        b_size = struct.pack(">L", self.size_of_payload)
-        bytestring = b_id + b_purpose + b_number + b_size + self.payload
-        return bytestring + Message.calculate_checksum(bytestring)
+        return bytes(MessageCodec(len(self.payload)).encode(self))
     
     def set_purpose(self, purpose):
         self.purpose = Message.Purpose(purpose)
@@ -97,39 +120,63 @@ class Message:
     
     @staticmethod
     def calculate_checksum(bytestring: str):
-        return struct.pack(">B", reduce(lambda a,b: a ^ b, bytestring))
+        return XorChecksum.calculate(bytestring)
     
     @staticmethod
     def log_message(msg : 'Message', filename : str):
         with open(filename, 'a') as f:
             f.write(f"TIMESTAMP,{datetime.now()}|{msg}\n")
 
+    # Split big_payload into Messages whose payloads are memoryview slices of it,
+    # so nothing is copied until a piece is sent.
+    # Numbered from 1 + index_offset; 0 acts as a sentinel value for the last piece.
     @staticmethod
-    def message_split(big_payload : bytearray, purpose_for_all : int, index_offset : int = 0):
-        MAX_SIZE = 4096
-        print(len(big_payload))
-
+    def message_split(big_payload : bytes, purpose_for_all : int, index_offset : int = 0, chunk_size : int = CHUNK_SIZE):
+        view = memoryview(big_payload).cast('B')
         number : int = 1 + index_offset
         message_list = []
-        
-        while len(big_payload) > MAX_SIZE:
-            payload_temp = big_payload[:MAX_SIZE]
-            message_list.append(Message(purpose=purpose_for_all,payload=payload_temp,number=number))
 
-            # message_list[number-1] = bytestring[0:3] + b_num + b_size + bytestring[current_b:current_b+8192] + bytestring[-1]
+        for offset in range(0, len(view) - chunk_size, chunk_size):
+            message_list.append(Message(purpose=purpose_for_all, payload=view[offset:offset + chunk_size], number=number))
+            # the number is one byte: wrap past 255 without landing on the sentinel or the title
+            number = number + 1 if number < 255 else 2
 
-            big_payload = big_payload[MAX_SIZE:]
-            number += 1
+        message_list.append(Message(purpose=purpose_for_all, payload=view[len(message_list) * chunk_size:], number=0))
+        return message_list
 
-        # 0 acts as a sentinel value
-        message_list.append(Message(purpose=purpose_for_all, payload=big_payload, number=0))
+    # Lazily split a payload into offset-addressed chunks that the receiver
+    # can put back together in any order (see reassembler.py).
+    # chunk_size counts the data only, the chunk header comes on top of it.
+    @staticmethod
+    def transfer_split(big_payload : bytes, purpose_for_all : int, transfer_id : int=None, chunk_size : int=CHUNK_SIZE):
+        if transfer_id is None:
+            transfer_id = Message.next_transfer_id()
+        view = memoryview(big_payload).cast('B')
+        total_size = len(view)
 
-        # remaining = size % MAX_SIZE
-        # b_size = struct.pack(">L", remaining)
-        # b_num = struct.pack(">B", number)
+        for offset in range(0, max(total_size, 1), chunk_size):
+            header = Message.CHUNK_HEADER.pack(transfer_id, total_size, chunk_size, offset)
+            yield Message(purpose=purpose_for_all, payload=header + view[offset:offset + chunk_size])
 
-        # message_list[number-1] = bytestring[0:3] + b_num + b_size + bytestring[current_b:-1] + bytestring[-1]
-        return message_list
+    # pack message IDs as runs of consecutive IDs for a batched acknowledgment
+    @staticmethod
+    def pack_id_ranges(ids) -> bytes:
+        ranges = bytearray()
+        first = previous = None
+        for msg_id in sorted(ids):
+            if previous is not None and msg_id == previous + 1 and msg_id - first < 0xFFFF:
+                previous = msg_id
+                continue
+            if first is not None:
+                ranges += Message.ID_RANGE.pack(first, previous - first + 1)
+            first = previous = msg_id
+        if first is not None:
+            ranges += Message.ID_RANGE.pack(first, previous - first + 1)
+        return bytes(ranges)
+
+    @staticmethod
+    def unpack_id_ranges(payload : bytes) -> list[range]:
+        return [range(first, first + count) for first, count in Message.ID_RANGE.iter_unpack(payload)]
 
     @staticmethod
     def test_checksum(bytestring, checksum) -> tuple[bool, bytes, bytes]:
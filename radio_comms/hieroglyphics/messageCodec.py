@@ -0,0 +1,67 @@
+import struct
+
+from checksum import Checksum, Crc16Checksum, XorChecksum
+
+### FRAME STRUCTURE (version 2):
+    # HEADER: SYNC (2) | VERSION (1) | FLAGS (1) | SESSION (1) | ID (2) | PURPOSE (1) | NUMBER (1) | SIZE OF PAYLOAD (4)
+    # FLAGS: low 3 bits = compression engine of the payload (see compression.py), 0 if uncompressed
+    # SESSION: picked at random when the sender starts, so a restart is told apart from old IDs
+    # HEADER CHECKSUM: CRC16 over the header (2)
+    # PAYLOAD: SIZE OF PAYLOAD bytes
+    # PAYLOAD CHECKSUM: over the payload only, size depends on the engine (XOR: 1 byte)
+class MessageCodec:
+
+    SYNC = b'\xd0\x9e'
+    VERSION = 2
+    HEADER = struct.Struct(">2sBBBHBBL")
+    HEADER_CHECKSUM = Crc16Checksum
+    HEADER_SIZE = HEADER.size + HEADER_CHECKSUM.SIZE
+    COMPRESSION_MASK = 0x07
+
+    # the transports split payloads at their CHUNK_SIZE (4096 bytes on serial, 16384 on
+    # the socket, whose deframer raises the limit); anything much bigger is a corrupt length
+    MAX_PAYLOAD_SIZE = 8192
+
+    # One codec per writer: encode() hands back a view into a buffer that is
+    # reused by the next call, so the frame must be written out before then.
+    def __init__(self, initialSize : int=4096, checksum : type[Checksum]=XorChecksum):
+        self.checksum = checksum
+        self.checksumSize = checksum.SIZE
+        self.buffer = bytearray(MessageCodec.HEADER_SIZE + initialSize + self.checksumSize)
+
+    def frameSize(self, message) -> int:
+        return MessageCodec.HEADER_SIZE + len(message.payload) + self.checksumSize
+
+    # pack the whole frame into the reusable buffer without intermediate bytes objects
+    def encode(self, message) -> memoryview:
+        size = self.frameSize(message)
+        if len(self.buffer) < size:
+            self.buffer = bytearray(size)
+
+        view = memoryview(self.buffer)
+        end = size - self.checksumSize
+        MessageCodec.packHeader(view, message)
+        view[MessageCodec.HEADER_SIZE:end] = message.payload
+        view[end:size] = self.checksum.calculate(view[MessageCodec.HEADER_SIZE:end])
+        return view[:size]
+
+    @staticmethod
+    def packHeader(buffer, message) -> None:
+        MessageCodec.HEADER.pack_into(buffer, 0, MessageCodec.SYNC, MessageCodec.VERSION, message.flags,
+                                      message.session, message.msg_id, int(message.purpose), message.number, len(message.payload))
+        buffer[MessageCodec.HEADER.size:MessageCodec.HEADER_SIZE] = MessageCodec.HEADER_CHECKSUM.calculate(buffer[:MessageCodec.HEADER.size])
+
+    # returns (msg_id, purpose, number, size_of_payload, flags, session),
+    # or None if the sync word, version, header checksum or length are wrong
+    @staticmethod
+    def decodeHeader(header, maxPayloadSize : int=MAX_PAYLOAD_SIZE) -> tuple[int, int, int, int, int, int]:
+        sync, version, flags, session, msg_id, purpose, number, size_of_payload = MessageCodec.HEADER.unpack_from(header)
+        if sync != MessageCodec.SYNC or version != MessageCodec.VERSION or size_of_payload > maxPayloadSize:
+            return None
+        if MessageCodec.HEADER_CHECKSUM.calculate(header[:MessageCodec.HEADER.size]) != header[MessageCodec.HEADER.size:MessageCodec.HEADER_SIZE]:
+            return None
+        return msg_id, purpose, number, size_of_payload, flags, session
+
+    def verify(self, payload, checksum) -> tuple[bool, bytes]:
+        calculated = self.checksum.calculate(payload)
+        return checksum == calculated, calculated
@@ -10,12 +10,19 @@ class MessageProcessor:
         open(self.log, 'w').close()
 
     def handleAcknowledgment(self, message : Message):
+        if message.purpose == Message.Purpose.ACK_BATCH:
+            ranges = Message.unpack_id_ranges(message.get_payload())
+            self.scheduler.handleAcknowledgments(ranges)
+            print(f'acknowledgment for message IDs {", ".join(f"{r.start}-{r.stop - 1}" for r in ranges)} received.')
+            return
+
         messageID = struct.unpack(">H", message.get_payload())[0]
         self.scheduler.handleAcknowledgment(messageID)
         print(f'acknowledgment for message with ID {messageID} received.')
 
-    def generateAcknowledgment(self, message : Message) -> Message:
-        return Message(new=True, purpose=Message.Purpose.ACK, payload=struct.pack(">H", message.msg_id))
+    # queue an acknowledgment; the scheduler coalesces them into ACK_BATCH messages
+    def acknowledge(self, message : Message) -> None:
+        self.scheduler.acknowledge(message.msg_id)
 
     def handleDebugMessage(self, message : Message):
         errorString = message.get_payload().decode()
@@ -30,3 +37,9 @@ class MessageProcessor:
 
     def addListOfMessages(self, messageList : list[Message], topic='all') -> None:
         self.scheduler.addListOfMessages(messageList, topic)
+
+    def clearTopic(self, topic : str) -> None:
+        self.scheduler.clearTopic(topic)
+
+    def chunkSize(self) -> int:
+        return self.scheduler.chunkSize()
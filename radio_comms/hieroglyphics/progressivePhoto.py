@@ -0,0 +1,47 @@
+import struct
+
+from imageCapturer import ImageCapturer
+from jpegEncoder import JpegEncoder
+from message import Message
+
+# Progressive HD photos. After a low definition preview (sent on its own), the
+# photo goes out as a few resolution tiers, each a complete JPEG in its own
+# chunked transfer, smallest first. The base station replaces its copy of the
+# photo with every tier that lands, so the operator has something to look at
+# long before the full resolution arrives.
+#
+# PAYLOAD: HEADER | JPEG
+#   HEADER: PHOTO NUMBER (2) | TIER (1) | TIER COUNT (1)
+HEADER = struct.Struct(">HBB")
+PHOTO_NUMBERS = 1 << 16
+
+class ProgressivePhoto:
+
+    # fractions of the full width, each tier about 4x the bytes of the one before
+    TIER_SCALES=(0.25, 0.5, 1.0)
+    QUALITY=90
+
+    # minWidth: tiers no wider than this are skipped, e.g. the preview's width
+    def __init__(self, frame, photoNumber : int, minWidth : int=0, quality : int=QUALITY, encoder : JpegEncoder=None):
+        self.frame = frame
+        self.photoNumber = photoNumber % PHOTO_NUMBERS
+        self.quality = quality
+        self.encoder = encoder
+        fullWidth = frame.shape[1]
+        widths = sorted({int(fullWidth * scale) for scale in ProgressivePhoto.TIER_SCALES})
+        self.widths = [width for width in widths if width > minWidth or width == fullWidth]
+
+    # A stream for Scheduler.addListOfMessages: each tier is only encoded once the
+    # one before it has been queued, so a cancelled photo costs no further encoding.
+    def messages(self, chunkSize : int):
+        fullWidth = self.frame.shape[1]
+        for tier, width in enumerate(self.widths):
+            buffer = ImageCapturer.encodeImage(self.frame, self.quality, width if width < fullWidth else None, self.encoder)
+            # a copy, the encoder may reuse its buffer for the next tier or photo
+            payload = HEADER.pack(self.photoNumber, tier, len(self.widths)) + buffer
+            yield from Message.transfer_split(big_payload=payload, purpose_for_all=Message.Purpose.HIGH_DEFINITION_PHOTO, chunk_size=chunkSize)
+
+# (photo number, tier, tier count, JPEG) of a reassembled tier
+def unpackTier(buffer) -> tuple[int, int, int, memoryview]:
+    photoNumber, tier, tierCount = HEADER.unpack_from(buffer)
+    return photoNumber, tier, tierCount, memoryview(buffer)[HEADER.size:]
@@ -0,0 +1,108 @@
+import time
+
+from scheduler import Scheduler
+
+# Picks JPEG quality, width and frame rate for the video feed from what the
+# link actually delivers: acknowledged bytes per second on the video topic and
+# the round trip time, both measured by the Scheduler. Each frame gets the byte
+# budget that arrives within the target latency; the controller steps down the
+# ladder as soon as frames outgrow it, and back up only once frames fit in half
+# of it for a while, so a range change during a drive costs sharpness and
+# frame rate instead of a feed that is tens of seconds behind.
+class RateController:
+
+    # (width, JPEG quality), best first
+    LADDER = [(640, 50), (480, 45), (320, 40), (320, 30), (240, 30), (200, 30), (160, 25), (120, 20), (96, 15)]
+    # how long a frame may take from capture to the base station
+    TARGET_LATENCY=1.0
+    # a frame always gets at least this long on the link
+    MIN_SEND_TIME=0.2
+    MIN_FPS=0.2
+    MAX_FPS=15
+    # frames that must fit in half the budget before stepping up
+    STEP_UP_FRAMES=5
+    # shortest window to measure throughput over
+    SAMPLE_TIME=0.5
+    # weight of a new throughput sample
+    SMOOTHING=0.3
+    # growth of the throughput estimate per sample while the link keeps up
+    PROBE_GAIN=1.1
+
+    def __init__(self, scheduler : Scheduler, topic : str='vid_feed', targetLatency : float=TARGET_LATENCY, level : int=5):
+        self.scheduler = scheduler
+        self.topic = topic
+        self.targetLatency = targetLatency
+        self.level = level
+        self.throughput : float = None
+        self.goodFrames = 0
+        self.lastSampleTime = time.time()
+        self.lastAcknowledgedBytes = 0
+
+    def width(self) -> int:
+        return RateController.LADDER[self.level][0]
+
+    def quality(self) -> int:
+        return RateController.LADDER[self.level][1]
+
+    # Achieved bytes per second. Only a backlogged topic shows what the link can
+    # do; while frames go out as fast as they come the estimate creeps back up
+    # (to at most the topic's nominal share) so a recovered link gets used again.
+    def measure(self) -> None:
+        now = time.time()
+        elapsed = now - self.lastSampleTime
+        if elapsed < RateController.SAMPLE_TIME:
+            return
+        acknowledged = self.scheduler.acknowledgedBytes.get(self.topic, 0)
+        rate = (acknowledged - self.lastAcknowledgedBytes) / elapsed
+        if self.scheduler.queuedBytes(self.topic):
+            self.throughput = rate if self.throughput is None else (1 - RateController.SMOOTHING) * self.throughput + RateController.SMOOTHING * rate
+        elif self.throughput is not None:
+            self.throughput *= RateController.PROBE_GAIN
+            nominal = self.scheduler.topicRate(self.topic)
+            if nominal:
+                self.throughput = min(self.throughput, nominal)
+        self.lastSampleTime = now
+        self.lastAcknowledgedBytes = acknowledged
+
+    # best guess of bytes per second, before any acknowledgment the link's nominal share
+    def rate(self) -> float:
+        if self.throughput is not None:
+            return self.throughput
+        return self.scheduler.topicRate(self.topic)
+
+    # bytes a frame may take to arrive within the target latency
+    def frameBudget(self) -> float:
+        rate = self.rate()
+        if not rate:
+            return None
+        roundTripTime = self.scheduler.roundTripTime() or 0
+        return rate * max(RateController.MIN_SEND_TIME, self.targetLatency - roundTripTime / 2)
+
+    # call with the size of every encoded frame to adjust the next one
+    def frameEncoded(self, frameSize : int) -> None:
+        self.measure()
+        budget = self.frameBudget()
+        if budget is None:
+            return
+        if frameSize > budget:
+            self.goodFrames = 0
+            self.level = min(self.level + 1, len(RateController.LADDER) - 1)
+        elif frameSize < budget / 2:
+            self.goodFrames += 1
+            if self.goodFrames >= RateController.STEP_UP_FRAMES:
+                self.goodFrames = 0
+                self.level = max(self.level - 1, 0)
+        else:
+            self.goodFrames = 0
+
+    # seconds between frames of this size so they don't queue up behind each other,
+    # None while there is no rate to go by
+    def frameInterval(self, frameSize : int) -> float:
+        rate = self.rate()
+        if not rate:
+            return None
+        return min(1 / RateController.MIN_FPS, max(1 / RateController.MAX_FPS, frameSize / rate))
+
+    def __str__(self) -> str:
+        throughput = f'{self.throughput:.0f}' if self.throughput is not None else '?'
+        return f'width={self.width()},quality={self.quality()},throughput={throughput}B/s'
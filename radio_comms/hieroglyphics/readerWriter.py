@@ -3,9 +3,20 @@ from message import Message
 
 class ReaderWriter: 
 
+    # how big a piece large payloads are split into for this transport
+    CHUNK_SIZE=4096
+
 ##### READ FROM THE SERIAL PORT for incoming messages
     def readMessage(self) -> Message:
         pass
 
     def writeMessage(self, message : Message) -> None:
         pass
+
+    # bytes on the wire for this message, header and checksum included
+    def frameSize(self, message : Message) -> int:
+        return self.codec.frameSize(message)
+
+    # how fast the link drains, None if it should not be paced
+    def bytesPerSecond(self) -> float:
+        return None
@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict, deque
+
+from message import Message
+
+# Puts chunked transfers (see Message.transfer_split) back together.
+# Every transfer gets a buffer of its full size up front, and chunks are
+# written straight to their offset, so they may arrive in any order and
+# retransmitted duplicates are simply ignored.
+class Reassembler:
+
+    class Transfer:
+        def __init__(self, total_size : int, chunk_size : int):
+            self.total_size = total_size
+            self.chunk_size = chunk_size
+            self.buffer = bytearray(total_size)
+            self.chunk_count = max(1, -(-total_size // chunk_size))
+            # one entry per chunk, nonzero once it has arrived
+            self.received = bytearray(self.chunk_count)
+            self.remaining = self.chunk_count
+            self.lastUpdate = time.time()
+
+        def matches(self, total_size : int, chunk_size : int) -> bool:
+            return self.total_size == total_size and self.chunk_size == chunk_size
+
+    # maxTransfers: incomplete transfers kept at once, the least recently
+    # updated one is dropped to make room (e.g. a video frame that lost a chunk)
+    def __init__(self, maxTransfers : int=4):
+        self.maxTransfers = maxTransfers
+        # keyed by (sender session, purpose, transfer ID): transfer IDs start over when the sender restarts
+        self.transfers : OrderedDict[tuple[int, int, int], Reassembler.Transfer] = OrderedDict()
+        # late retransmissions of finished transfers must not start new ones
+        self.completed : deque[tuple[int, int, int]] = deque(maxlen=16)
+
+    # returns the whole payload once its last missing chunk arrives, otherwise None
+    def addChunk(self, message : Message) -> bytearray:
+        payload = message.get_payload()
+        header_size = Message.CHUNK_HEADER.size
+        if len(payload) < header_size:
+            print(f'--Error: chunk too short to hold a transfer header. {message}')
+            return None
+        transfer_id, total_size, chunk_size, offset = Message.CHUNK_HEADER.unpack_from(payload)
+        data = memoryview(payload)[header_size:]
+
+        index, misaligned = divmod(offset, chunk_size) if chunk_size else (0, 1)
+        expected_size = min(chunk_size, total_size - offset)
+        if misaligned or len(data) != expected_size:
+            print(f'--Error: chunk at offset {offset} of transfer {transfer_id} does not fit. {message}')
+            return None
+
+        key = (message.session, int(message.purpose), transfer_id)
+        if key in self.completed:
+            return None
+        transfer = self.transfers.get(key)
+        if transfer is None or not transfer.matches(total_size, chunk_size):
+            transfer = self.startTransfer(key, total_size, chunk_size)
+
+        self.transfers.move_to_end(key)
+        transfer.lastUpdate = time.time()
+        if transfer.received[index]:
+            return None
+
+        transfer.buffer[offset:offset + len(data)] = data
+        transfer.received[index] = 1
+        transfer.remaining -= 1
+        if transfer.remaining:
+            return None
+
+        del self.transfers[key]
+        self.completed.append(key)
+        return transfer.buffer
+
+    def startTransfer(self, key : tuple[int, int, int], total_size : int, chunk_size : int) -> 'Reassembler.Transfer':
+        while len(self.transfers) >= self.maxTransfers:
+            (_, purpose, transfer_id), _ = self.transfers.popitem(last=False)
+            print(f'--Error: dropped incomplete transfer {transfer_id} of purpose {Message.Purpose(purpose).name}')
+        transfer = Reassembler.Transfer(total_size, chunk_size)
+        self.transfers[key] = transfer
+        return transfer
+
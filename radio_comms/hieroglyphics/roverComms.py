@@ -20,7 +20,7 @@ from roverMessageProcessor import RoverMessageProcessor
 from socketReaderWriter import SocketReaderWriter
 from serialReaderWriter import SerialReaderWriter
 from readerWriter import ReaderWriter
-from concurrentSet import ConcurrentSet
+from duplicateDetector import DuplicateDetector
 
 def main():
     # port = '/dev/cu.usbserial-BG00HO5R'
@@ -45,11 +45,15 @@ def main():
     readerWriter : ReaderWriter = SerialReaderWriter(port, baud, timeout, messageQueue)
     # readerWriter : ReaderWriter = SocketReaderWriter('localhost', 9999, messageQueue, rover=True)
     scheduler = Scheduler(readerWriter=readerWriter, topics=topics)
+    # only the newest position is worth sending
+    scheduler.set_mode('position', Scheduler.LATEST)
+    # logs, error text and files shrink a lot; JPEGs are skipped automatically
+    scheduler.set_compression('status', 'zlib')
+    scheduler.set_compression('file', 'zlib')
 
     executor = concurrent.futures.ThreadPoolExecutor(4)
     future_scheduler = executor.submit(scheduler.sendMessages, messageQueue)
     future_msg_process = executor.submit(process_messages, messageQueue, scheduler)
-    # future_video = executor.submit(capture_video)
 
     print('entering read loop')
 
@@ -70,7 +74,6 @@ def main():
     messageQueue.shutdown()
     executor.shutdown()
 
-# capture_video_eh = False
 
 def process_messages(messageQueue : MessageQueue, scheduler : Scheduler) -> None:
     print('thread activated :)')
@@ -95,8 +98,8 @@ def process_messages(messageQueue : MessageQueue, scheduler : Scheduler) -> None
     arduinoPath = '/dev/ttyACMO'
     # arduinoPath = None
 
-    messageProcessor = RoverMessageProcessor(MSG_LOG, scheduler, arduinoPath)
-    alreadyProcessedMessages = ConcurrentSet()
+    messageProcessor = RoverMessageProcessor(MSG_LOG, scheduler, arduinoPath, CAM_PATHS)
+    alreadyProcessedMessages = DuplicateDetector()
 
     try:
      while messageQueue.isRunning():
@@ -104,17 +107,16 @@ def process_messages(messageQueue : MessageQueue, scheduler : Scheduler) -> None
         currentMessage = messageQueue.pop()
         Message.log_message(currentMessage, MSG_LOG)
 
-        if currentMessage.purpose == Message.Purpose.ACK:
+        if currentMessage.purpose in (Message.Purpose.ACK, Message.Purpose.ACK_BATCH):
             messageProcessor.handleAcknowledgment(currentMessage)
             continue
 
-        acknowledgment = messageProcessor.generateAcknowledgment(currentMessage) 
-        scheduler.addMessage(acknowledgment, 'acknowledgment')
+        messageProcessor.acknowledge(currentMessage)
 
-        if currentMessage.msg_id in alreadyProcessedMessages:
+        if alreadyProcessedMessages.isDuplicate(currentMessage.msg_id, currentMessage.session):
             continue
 
-        alreadyProcessedMessages.add(currentMessage.msg_id)
+        alreadyProcessedMessages.add(currentMessage.msg_id, currentMessage.session)
 
         if currentMessage.purpose == Message.Purpose.ERROR:
             messageProcessor.handleDebugMessage(currentMessage)
@@ -132,13 +134,16 @@ def process_messages(messageQueue : MessageQueue, scheduler : Scheduler) -> None
             messageProcessor.handleLowDefPhotoRequestMessage(currentMessage)
         
         elif currentMessage.purpose == Message.Purpose.FILE_CONTENTS:
+            messageProcessor.handleFileTransferMessage(currentMessage)
+
+        elif currentMessage.purpose == Message.Purpose.REQUEST_FILE:
             messageProcessor.handleFileContentsRequestMessage(currentMessage)
         
         else:
             print('--Error: message matched no known purposes.')
     except Exception as e:
         print('--error(process messages): ', e)
-    messageProcessor.imageCapturer.stopTakingVideo()
+    messageProcessor.stopVideo()
 
 # import rclpy
 # from rclpy.node import Node
@@ -1,29 +1,42 @@
+import itertools
 from serial import Serial
 import struct
+import time
 
+from fileTransfer import FileTransfer
 from imageCapturer import ImageCapturer
+from progressivePhoto import ProgressivePhoto
 from scheduler import Scheduler
+from videoStreamer import VideoStreamer
 from message import Message
 from messageProcessor import MessageProcessor
 
 class RoverMessageProcessor:
 
     VIDEO_WIDTH=200 
+    # second byte of a VIDEO message asking for a keyframe in delta mode
+    KEYFRAME_REQUEST=2
 
     def __init__(self, log : str, scheduler : Scheduler, arduinoPath='/dev/ttyACM0', cameraPaths=0):
         self.messageProcessor = MessageProcessor(log, scheduler)
+        self.fileTransfer = FileTransfer(scheduler, 'file')
         if arduinoPath:
             self.arduino = Serial(arduinoPath)
         else:
             self.arduino = None
-        # self.imageCapturer = ImageCapturer(cameraPaths)
-
-    def generateAcknowledgment(self, message : Message) -> Message:
-        return self.messageProcessor.generateAcknowledgment(message)
+        self.imageCapturer = ImageCapturer(cameraPaths)
+        # keep the camera awake and its queue drained so photos are of the current scene
+        self.imageCapturer.startCapturing()
+        self.videoStreamer = VideoStreamer(self.imageCapturer, scheduler, 'vid_feed')
+        # from the clock, so numbers from before a restart are not reused right away
+        self.photoNumbers = itertools.count(int(time.time()))
 
     def handleAcknowledgment(self, message : Message):
         self.messageProcessor.handleAcknowledgment(message)
 
+    def acknowledge(self, message : Message) -> None:
+        self.messageProcessor.acknowledge(message)
+
     def handleDebugMessage(self, message : Message):
         self.messageProcessor.handleDebugMessage(message)
 
@@ -44,62 +57,98 @@ class RoverMessageProcessor:
         if self.arduino:
             self.arduino.write(floatString.encode())
 
-    # TODO: This currently just sends a single frame.
-    # This ought to query the true camera, and have it continue to send photos back here.
-    # This may require harder integration...
+    # payload: camera to stream from, -1 to stop the feed, then optionally 1 for delta mode
+    # (or KEYFRAME_REQUEST, camera ignored, when the base station lost a delta's base frame)
     def handleVideoToggleMessage(self, message : Message):
-        cameraNumber = struct.unpack('>b', message.get_payload())[0] 
+        payload = message.get_payload()
+        if len(payload) > 1 and payload[1] == self.KEYFRAME_REQUEST:
+            self.videoStreamer.requestKeyframe()
+            return
+        cameraNumber = struct.unpack_from('>b', payload)[0]
         if cameraNumber == -1:
-            self.imageCapturer.stopTakingVideo()
-
-        self.imageCapturer.startTakingVideo()
-        self.changeCamera(cameraNumber)
+            self.videoStreamer.stop()
+            print('video feed stopped')
+            return
 
+        try:
+            self.imageCapturer.changeCamera(cameraNumber)
+        except IndexError:
+            self.reportMissingCamera(cameraNumber)
+            return
+        deltaMode = len(payload) > 1 and payload[1] == 1
+        self.videoStreamer.setDeltaMode(deltaMode)
+        self.videoStreamer.start()
+        print(f'video feed started from camera {cameraNumber}' + (' in delta mode' if deltaMode else ''))
+
+    def stopVideo(self) -> None:
+        self.videoStreamer.stop()
+        self.imageCapturer.stopCapturing()
+
+    def reportMissingCamera(self, cameraNumber : int) -> None:
+        error_str = f'--Error: there is no camera {cameraNumber}.'
+        print(error_str)
+        self.messageProcessor.addMessage(Message(purpose=Message.Purpose.ERROR, payload=error_str.encode()), 'status')
+
+    # photo requests name the camera in their first payload byte
+    def captureRequestedImage(self, message : Message, quality : int, resize_width : int=None):
+        payload = message.get_payload()
+        cameraNumber = payload[0] if payload else self.imageCapturer.cameraIndex
+        try:
+            return self.imageCapturer.captureImage(quality, resize_width, cameraNumber)
+        except IndexError:
+            self.reportMissingCamera(cameraNumber)
+            return 0, None
+
+    # payload: camera, then optionally 1 to cancel the HD photo being sent.
+    # A preview goes out on 'ldp' right away, then the photo in growing
+    # resolutions on 'hdp' (see progressivePhoto.py).
     def handleHighDefPhotoRequestMessage(self, message : Message):
-        length, buffer = self.imageCapturer.captureImage(90)
+        payload = message.get_payload()
+        if len(payload) > 1 and payload[1] == 1:
+            self.messageProcessor.clearTopic('hdp')
+            print('HD photo cancelled')
+            return
+
+        cameraNumber = payload[0] if payload else self.imageCapturer.cameraIndex
+        try:
+            _, frame = self.imageCapturer.getLatestFrame(cameraIndex=cameraNumber)
+        except IndexError:
+            self.reportMissingCamera(cameraNumber)
+            return
         print('Image captured')
-        if buffer is None:
+        if frame is None:
             print('error no image could be grabbed')
-            errorString = 'Error: could not capture a high definition photo.'
-            self.messageProcessor.addListOfMessages(Message(purpose=Message.Purpose.ERROR, payload=error_str.encode()), 'status')
+            error_str = 'Error: could not capture a high definition photo.'
+            self.messageProcessor.addMessage(Message(purpose=Message.Purpose.ERROR, payload=error_str.encode()), 'status')
+            return
 
-        print('splitting messages')
-        msgs = Message.message_split(big_payload=buffer.tobytes(), purpose_for_all=Message.Purpose.HIGH_DEFINITION_PHOTO)
-        print('messages split')
-        self.messageProcessor.addListOfMessages(msgs, 'hdp')
-        print('Message added of length ', len(buffer.tobytes()))
+        self.sendLowDefPhoto(ImageCapturer.encodeImage(frame, 90, self.VIDEO_WIDTH))
+        photo = ProgressivePhoto(frame, next(self.photoNumbers), self.VIDEO_WIDTH)
+        self.messageProcessor.addListOfMessages(photo.messages(self.messageProcessor.chunkSize()), 'hdp')
+        print(f'HD photo {photo.photoNumber} queued in widths {photo.widths}')
 
     def handleLowDefPhotoRequestMessage(self, message : Message):
         print('getting an ldp photo')
-        _, buffer = self.imageCapturer.captureImage(90, self.VIDEO_WIDTH)
+        _, buffer = self.captureRequestedImage(message, 90, self.VIDEO_WIDTH)
         if buffer is None:
             error_str = 'Error: could not capture hdp.'
             print(error_str)
             self.messageProcessor.addMessage(Message(purpose=Message.Purpose.ERROR, payload=error_str.encode()), 'status')
             return
+        self.sendLowDefPhoto(buffer)
 
-        msgs = Message.message_split(big_payload=buffer.tobytes(), purpose_for_all=Message.Purpose.LOW_DEFINITION_PHOTO)
+    # split right away: the encoder may reuse the buffer for its next frame
+    def sendLowDefPhoto(self, buffer : memoryview) -> None:
+        msgs = list(Message.transfer_split(big_payload=buffer, purpose_for_all=Message.Purpose.LOW_DEFINITION_PHOTO, chunk_size=self.messageProcessor.chunkSize()))
         self.messageProcessor.addListOfMessages(msgs, 'ldp')
-        print('Message added of length ', len(buffer.tobytes()))
+        print('Message added of length ', len(buffer))
 
+    # REQUEST_FILE: send files (or parts of them) matching a path or glob, or list a directory
     def handleFileContentsRequestMessage(self, message : Message):
-        path = message.get_payload().decode()
-        if not os.path.exists(path):
-            error_str = f'--Error: filepath {path} does not exist.'
+        error_str = self.fileTransfer.handleRequest(message)
+        if error_str:
             print(error_str)
             self.messageProcessor.addMessage(Message(purpose=Message.Purpose.ERROR, payload=error_str.encode()), 'status')
-            return
-
-        with open(path, 'rb') as f:
-            contents = f.read()
-
-        msg_title = Message(new=True, purpose=Message.Purpose.FILE_CONTENTS, number=1, payload=os.path.basename(path).encode())
-        self.messageProcessor.addMessage(msg_title, 'file')
-        self.messageProcessor.addListOfMessages(Message.message_split(purpose_for_all=Message.Purpose.FILE_CONTENTS, big_payload=contents, index_offset=1), 'file')
-
-    def capture_video(self):
-        while self.imageCapturer.isTakingVideo():
-            self.imageCapturer.captureImage(30, ImageCapturer.VIDEO_WIDTH)
-
-        self.messageProcessor.addListOfMessages(Message.message_split(big_payload=frame.tobytes(), purpose_for_all=Message.Purpose.VIDEO), 'vid_feed')
 
+    def handleFileTransferMessage(self, message : Message):
+        self.fileTransfer.handleMessage(message)
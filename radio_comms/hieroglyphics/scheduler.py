@@ -6,88 +6,519 @@
 
 import serial
 from message import Message
-from collections import deque
+from messageCodec import MessageCodec
+from compression import AdaptiveCompression, Compressor, COMPRESSORS_BY_NAME
+from collections import deque, OrderedDict
 from readerWriter import ReaderWriter
 from messageQueue import MessageQueue
 from concurrentSet import ConcurrentSet
+from tokenBucket import TokenBucket
+from itertools import chain
+import threading
 import time
 
 class Scheduler:
 
-    RETRANSMISSION_COUNTER=1
+    # default number of unacknowledged messages a topic may have on the link
+    WINDOW_SIZE=8
+    # give up on a message after this many retransmissions
+    MAX_RETRANSMISSIONS=10
+    # how long to wait for more IDs before sending a batched acknowledgment
+    ACK_DELAY=0.05
+    # ID ranges per ACK_BATCH message, keeps it well under a chunk
+    MAX_RANGES_PER_ACK=256
+    # bytes of budget a topic gets per round for each point of wrr value
+    QUANTUM=1024
+    # bytes that may go to the transport back to back, about what the radio modem buffers
+    BURST_BYTES=2048
+    # longest the sending thread sleeps before rechecking if it should shut down
+    MAX_IDLE=1.0
+    # these are never acknowledged themselves
+    ACKNOWLEDGMENT_PURPOSES = (Message.Purpose.ACK, Message.Purpose.ACK_BATCH)
+    # safety-critical purposes skip the round robin and go out at the next frame boundary
+    PRIORITY_PURPOSES = (Message.Purpose.MOVEMENT, Message.Purpose.ACK, Message.Purpose.ACK_BATCH)
+    # a newer unsent message of one of these purposes replaces the older one
+    SUPERSEDING_PURPOSES = (Message.Purpose.MOVEMENT,)
+    PRIORITY_TOPIC='priority'
+    # topic modes: QUEUE sends every message in order, LATEST keeps only
+    # the newest unsent message per key (by default per purpose)
+    QUEUE='queue'
+    LATEST='latest'
+
+    # a sent message waiting on its acknowledgment
+    class Transmission:
+        def __init__(self, message : Message, topic : str, sentAt : float, key=None):
+            self.message = message
+            self.topic = topic
+            self.sentAt = sentAt
+            self.retransmissions = 0
+            # set if a newer message with the same key makes this one stale
+            self.key = key
+
+    # retransmission timeout from measured round trip times (Jacobson/Karels, RFC 6298)
+    class RoundTripTimer:
+        INITIAL_RTO=3.0
+        MIN_RTO=0.5
+        MAX_RTO=30.0
+
+        def __init__(self):
+            self.srtt : float = None
+            self.rttvar : float = None
+            self.rto : float = Scheduler.RoundTripTimer.INITIAL_RTO
+
+        def addSample(self, rtt : float) -> None:
+            if self.srtt is None:
+                self.srtt = rtt
+                self.rttvar = rtt / 2
+            else:
+                self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+                self.srtt = 0.875 * self.srtt + 0.125 * rtt
+            self.rto = min(max(self.srtt + 4 * self.rttvar, self.MIN_RTO), self.MAX_RTO)
+
+        # exponential backoff for messages that already timed out
+        def timeout(self, retransmissions : int) -> float:
+            return min(self.rto * (2 ** retransmissions), self.MAX_RTO)
 
     # topics: dict[str (topic name), int (wrr value)]
     # messages: dict[str (topic name), deque[message]]
-    def __init__(self, readerWriter : ReaderWriter, topics : dict[str, int]={}):
+    def __init__(self, readerWriter : ReaderWriter, topics : dict[str, int]={}, ackDelay : float=ACK_DELAY):
         self.readerWriter = readerWriter
         self.topics : dict[str, int] = topics
-        self.topics['acknowledgment'] = 5
         self.messages : dict[str, deque[Message]] = {topic : deque() for topic in self.topics}
-        self.retransmissionQueue : deque[Message] = deque()
+        self.windows : dict[str, int] = {topic : Scheduler.WINDOW_SIZE for topic in self.topics}
+        self.inFlightCounts : dict[str, int] = {topic : 0 for topic in self.topics}
+        self.budgets : dict[str, int] = {topic : wrr * Scheduler.QUANTUM for topic, wrr in self.topics.items()}
+        self.deficits : dict[str, int] = {topic : 0 for topic in self.topics}
+        self.modes : dict[str, str] = {topic : Scheduler.QUEUE for topic in self.topics}
+        self.keyFunctions : dict[str, callable] = {}
+        self.compression : dict[str, AdaptiveCompression] = {}
+        # bumped by clearTopic, so a stream that was mid-message during the clear is not put back
+        self.generations : dict[str, int] = {topic : 0 for topic in self.topics}
+        # strict priority lane ahead of every topic, guarded by self.condition
+        self.priorityLane : deque[Message] = deque()
+        self.inFlightCounts[Scheduler.PRIORITY_TOPIC] = 0
+        # only touched by the sendMessages thread, ordered by last send time
+        self.inFlight : OrderedDict[int, Scheduler.Transmission] = OrderedDict()
+        # acknowledgments handed over from the processing thread
         self.acknowledgedMessageIDs : ConcurrentSet = ConcurrentSet()
+        # IDs of received messages still to be acknowledged
+        self.pendingAcknowledgments : ConcurrentSet = ConcurrentSet()
+        # topics whose in-flight messages are to be dropped, handed over to the sendMessages thread
+        self.clearedTopics : ConcurrentSet = ConcurrentSet()
+        self.ackDelay = ackDelay
+        self.ackDeadline : float = 0
+        self.roundTripTimer = Scheduler.RoundTripTimer()
+        # payload bytes acknowledged per topic over the whole run, for throughput measurements
+        self.acknowledgedBytes : dict[str, int] = {}
+        # the sending thread sleeps on this until there is something to do
+        self.condition = threading.Condition()
+        self.workPending : bool = False
+        # refilled at the link's byte rate, None until the link reports one
+        self.tokenBucket : TokenBucket = None
 
     def set_topics(self, topics) -> None:
         self.topics = topics
         self.messages = {topic : deque() for topic in self.topics}
+        self.windows = {topic : Scheduler.WINDOW_SIZE for topic in self.topics}
+        self.inFlightCounts = {topic : 0 for topic in self.topics}
+        self.inFlightCounts[Scheduler.PRIORITY_TOPIC] = 0
+        self.budgets = {topic : wrr * Scheduler.QUANTUM for topic, wrr in self.topics.items()}
+        self.deficits = {topic : 0 for topic in self.topics}
+        self.modes = {topic : Scheduler.QUEUE for topic in self.topics}
+        self.keyFunctions = {}
+        self.compression = {}
+        self.generations = {topic : 0 for topic in self.topics}
 
     # wrr = weighted round robin value
-    # aka: how many messages of THIS one to send
+    # aka: how many QUANTUM bytes of THIS one to send
     #      for every wrr value of other topics
-    def add_topic(self, topic_name, wrr_val) -> None:
+    # window = how many of its messages may be unacknowledged at once
+    # budget = bytes per round, overrides wrr * QUANTUM
+    # mode, key = see set_mode
+    # compression = see set_compression
+    def add_topic(self, topic_name, wrr_val, window : int=WINDOW_SIZE, budget : int=None, mode : str=QUEUE, key=None, compression=None) -> None:
         self.topics[topic_name] = wrr_val
         self.messages[topic_name] = deque()
+        self.windows[topic_name] = window
+        self.inFlightCounts[topic_name] = 0
+        self.budgets[topic_name] = budget if budget is not None else wrr_val * Scheduler.QUANTUM
+        self.deficits[topic_name] = 0
+        self.generations[topic_name] = 0
+        self.set_mode(topic_name, mode, key)
+        self.set_compression(topic_name, compression)
+
+    # In LATEST mode a new message replaces any unsent message on the topic with
+    # the same key, and stops older sent ones with that key from being retransmitted.
+    # key: callable(Message) -> hashable, defaults to the message's purpose
+    def set_mode(self, topic_name, mode : str, key=None) -> None:
+        if topic_name not in self.topics:
+            raise IndexError(f'Scheduler cannot set mode of topic "{topic_name}" as it does not exist')
+        if mode not in (Scheduler.QUEUE, Scheduler.LATEST):
+            raise ValueError(f'Scheduler has no topic mode "{mode}"')
+        self.modes[topic_name] = mode
+        self.keyFunctions[topic_name] = key if key is not None else (lambda message: message.purpose)
+
+    # compress the payloads of a topic right before they first go out, skipping
+    # the ones that don't shrink enough (see compression.AdaptiveCompression)
+    # compressor: 'zlib', 'lzma', 'csv', a Compressor class, or None for no compression
+    def set_compression(self, topic_name, compressor : str | type[Compressor]) -> None:
+        if topic_name not in self.topics:
+            raise IndexError(f'Scheduler cannot set compression of topic "{topic_name}" as it does not exist')
+        if compressor is None:
+            self.compression.pop(topic_name, None)
+            return
+        if isinstance(compressor, str):
+            if compressor not in COMPRESSORS_BY_NAME:
+                raise ValueError(f'Scheduler has no compression "{compressor}"')
+            compressor = COMPRESSORS_BY_NAME[compressor]
+        self.compression[topic_name] = AdaptiveCompression(compressor)
+
+    def compress(self, topic : str, message : Message) -> None:
+        compression = self.compression.get(topic)
+        if compression is None or message.flags & MessageCodec.COMPRESSION_MASK:
+            return
+        payload, compressorID = compression.compress(message.payload)
+        if compressorID:
+            message.set_payload(payload)
+            message.flags |= compressorID
 
     # add message to a given "topic"
     # I call this a "topic" but it's probably called a "server" for an actual wrr
+    # safety-critical purposes (see PRIORITY_PURPOSES) go to the priority lane whatever the topic
     def addMessage(self, message: Message, topic : str='all') -> None:
         if topic not in self.messages:
             raise IndexError(f'Scheduler cannot add message to topic "{topic}" as it does not exist')
-        self.messages[topic].append(message)
+        if message.purpose in Scheduler.PRIORITY_PURPOSES:
+            self.addPriorityMessage(message)
+            return
+        if self.modes[topic] == Scheduler.LATEST:
+            with self.condition:
+                key = self.supersedingKey(topic, message)
+                stale = [queued for queued in self.messages[topic] if self.supersedingKey(topic, queued) == key]
+                for queued in stale:
+                    self.messages[topic].remove(queued)
+                self.messages[topic].append(message)
+        else:
+            self.messages[topic].append(message)
+        self.notify()
 
+    # messageList may also be an iterator/generator (e.g. Message.transfer_split), which is
+    # queued as a stream and only pulled from one message at a time as the link has room.
+    # Several streams on one topic take turns.
     def addListOfMessages(self, messageList, topic : str='all') -> None:
         if topic not in self.messages:
             raise IndexError(f'Scheduler cannot add list of messages to topic "{topic}" as it does not exist')
-        self.messages[topic].extend(messageList)
+        if self.modes[topic] == Scheduler.LATEST:
+            for message in messageList:
+                self.addMessage(message, topic)
+            return
+        if isinstance(messageList, (list, tuple)):
+            self.messages[topic].extend(messageList)
+        else:
+            self.messages[topic].append(iter(messageList))
+        self.notify()
+
+    # the next message of a topic without removing it, pulling it out of a stream if need be
+    def peekMessage(self, topic : str) -> Message:
+        queue = self.messages[topic]
+        while True:
+            with self.condition:
+                if not queue:
+                    return None
+                head = queue[0]
+                if isinstance(head, Message):
+                    return head
+                queue.popleft()
+                generation = self.generations[topic]
+
+            try:
+                message = next(head, None)
+            except Exception as e:
+                print(f'--Error: message stream on topic {topic} failed: {e}')
+                continue
+            if message is None:
+                continue
+
+            with self.condition:
+                # cleared while the stream was producing the message: drop both
+                if self.generations[topic] != generation:
+                    continue
+                queue.appendleft(message)
+                queue.append(head)
+            return message
+
+    # drop everything queued on a topic (streams included) and stop retransmitting
+    # what it already sent, e.g. when the base station cancels a transfer
+    def clearTopic(self, topic : str) -> None:
+        if topic not in self.messages:
+            raise IndexError(f'Scheduler cannot clear topic "{topic}" as it does not exist')
+        with self.condition:
+            self.messages[topic].clear()
+            self.generations[topic] += 1
+        self.clearedTopics.add(topic)
+        self.notify()
+
+    # payload bytes waiting on a topic; streams count only for what was already pulled out of them
+    def queuedBytes(self, topic : str) -> int:
+        with self.condition:
+            return sum(len(queued.payload) for queued in self.messages[topic] if isinstance(queued, Message))
+
+    # bytes per second a topic can expect: its wrr share among the topics that
+    # have something to send. None until the link reports a rate
+    def topicRate(self, topic : str) -> float:
+        rate = self.readerWriter.bytesPerSecond()
+        if not rate:
+            return None
+        active = sum(wrr for name, wrr in self.topics.items()
+                     if name == topic or self.messages[name] or self.inFlightCounts[name])
+        return rate * self.topics[topic] / active
+
+    # smoothed round trip time from send to acknowledgment, None before the first sample
+    def roundTripTime(self) -> float:
+        return self.roundTripTimer.srtt
+
+    # largest payload to put in one message on this link
+    def chunkSize(self) -> int:
+        return self.readerWriter.CHUNK_SIZE
+
+    # key under which a message replaces older ones, None if it never does
+    def supersedingKey(self, topic : str, message : Message):
+        if topic == Scheduler.PRIORITY_TOPIC:
+            return message.purpose if message.purpose in Scheduler.SUPERSEDING_PURPOSES else None
+        if self.modes.get(topic) == Scheduler.LATEST:
+            return self.keyFunctions[topic](message)
+        return None
+
+    # is a message with this key still waiting to be sent?
+    def hasQueuedReplacement(self, topic : str, key) -> bool:
+        queue = self.priorityLane if topic == Scheduler.PRIORITY_TOPIC else self.messages[topic]
+        with self.condition:
+            return any(self.supersedingKey(topic, queued) == key for queued in queue)
+
+    def addPriorityMessage(self, message : Message) -> None:
+        with self.condition:
+            if message.purpose in Scheduler.SUPERSEDING_PURPOSES:
+                stale = [queued for queued in self.priorityLane if queued.purpose == message.purpose]
+                for queued in stale:
+                    self.priorityLane.remove(queued)
+            self.priorityLane.append(message)
+            self.workPending = True
+            self.condition.notify()
+
+    def hasPriorityMessages(self) -> bool:
+        return bool(self.priorityLane) or (len(self.pendingAcknowledgments) > 0 and time.time() >= self.ackDeadline)
+
+    # send everything in the priority lane, plus any acknowledgments that are due
+    def sendPriorityMessages(self) -> None:
+        self.sendAcknowledgments()
+        while self.priorityLane:
+            with self.condition:
+                if not self.priorityLane:
+                    break
+                message = self.priorityLane.popleft()
+            try:
+                self.send(message, Scheduler.PRIORITY_TOPIC, preemptible=False)
+            except Exception as e:
+                print(f'--Error: sending priority message: {e}')
 
     def handleAcknowledgment(self, messageID : int):
         self.acknowledgedMessageIDs.add(messageID)
+        self.notify()
+
+    # apply every ID of a batched acknowledgment in one lock acquisition
+    def handleAcknowledgments(self, ranges : list[range]):
+        self.acknowledgedMessageIDs.update(chain.from_iterable(ranges))
+        self.notify()
+
+    # acknowledge a received message; IDs arriving within ackDelay share one ACK_BATCH
+    def acknowledge(self, messageID : int) -> None:
+        if not len(self.pendingAcknowledgments):
+            self.ackDeadline = time.time() + self.ackDelay
+        self.pendingAcknowledgments.add(messageID)
+        self.notify()
+
+    def sendAcknowledgments(self) -> None:
+        if not len(self.pendingAcknowledgments) or time.time() < self.ackDeadline:
+            return
+
+        payload = Message.pack_id_ranges(self.pendingAcknowledgments.drain())
+        rangesSize = Scheduler.MAX_RANGES_PER_ACK * Message.ID_RANGE.size
+        for start in range(0, len(payload), rangesSize):
+            acknowledgment = Message(new=True, purpose=Message.Purpose.ACK_BATCH, payload=payload[start:start + rangesSize])
+            try:
+                self.send(acknowledgment, Scheduler.PRIORITY_TOPIC, preemptible=False)
+            except Exception as e:
+                print(f'--Error: sending acknowledgments: {e}')
 
     def wasMessageAcknowledged(self, message : Message):
-        return message.msg_id in self.acknowledgedMessageIDs
+        return message.msg_id not in self.inFlight
+
+    def hasWindowSpace(self, topic : str) -> bool:
+        return self.inFlightCounts[topic] < self.windows[topic]
+
+    # wake the sending thread
+    def notify(self) -> None:
+        with self.condition:
+            self.workPending = True
+            self.condition.notify()
+
+    def hasSendableMessages(self) -> bool:
+        return any(self.messages[topic] and self.hasWindowSpace(topic) for topic in self.topics)
+
+    # next retransmission timeout or batched acknowledgment, None if there is neither
+    def nextDeadline(self) -> float:
+        deadlines = [transmission.sentAt + self.roundTripTimer.timeout(transmission.retransmissions)
+                     for transmission in self.inFlight.values()]
+        if len(self.pendingAcknowledgments):
+            deadlines.append(self.ackDeadline)
+        return min(deadlines, default=None)
+
+    # sleep until a message is added, an acknowledgment arrives or a timer is due
+    def waitForWork(self) -> None:
+        with self.condition:
+            if not self.workPending and not self.hasSendableMessages() and not self.priorityLane:
+                timeout = Scheduler.MAX_IDLE
+                deadline = self.nextDeadline()
+                if deadline is not None:
+                    timeout = min(timeout, max(0, deadline - time.time()))
+                self.condition.wait(timeout)
+            self.workPending = False
+
+    # only hand the transport what the link can drain, so the radio modem's
+    # buffer never fills up behind the scheduler's back.
+    # While a round robin frame waits for the link, priority messages go first.
+    def pace(self, message : Message, preemptible : bool=True) -> None:
+        rate = self.readerWriter.bytesPerSecond()
+        if not rate:
+            return
+        if self.tokenBucket is None:
+            self.tokenBucket = TokenBucket(rate, Scheduler.BURST_BYTES)
+        else:
+            self.tokenBucket.setRate(rate)
+
+        size = self.readerWriter.frameSize(message)
+        delay = self.tokenBucket.delay(size)
+        while delay > 0:
+            if preemptible and len(self.pendingAcknowledgments):
+                delay = min(delay, max(0, self.ackDeadline - time.time()))
+            with self.condition:
+                if not (preemptible and self.hasPriorityMessages()):
+                    self.condition.wait(delay)
+            if preemptible and self.hasPriorityMessages():
+                self.sendPriorityMessages()
+            delay = self.tokenBucket.delay(size)
+        self.tokenBucket.consume(size)
+
+    def send(self, message : Message, topic : str, preemptible : bool=True) -> None:
+        self.pace(message, preemptible)
+        self.readerWriter.writeMessage(message)
+        print(f'sent message of purpose {message.purpose.name}')
+
+        if message.purpose not in Scheduler.ACKNOWLEDGMENT_PURPOSES:
+            key = self.supersedingKey(topic, message)
+            if key is not None:
+                stale = [transmission for transmission in self.inFlight.values()
+                         if transmission.topic == topic and transmission.key == key]
+                for transmission in stale:
+                    self.dropTransmission(transmission)
+            self.inFlight[message.msg_id] = Scheduler.Transmission(message, topic, time.time(), key)
+            self.inFlightCounts[topic] += 1
+
+    def dropTransmission(self, transmission : 'Scheduler.Transmission') -> None:
+        del self.inFlight[transmission.message.msg_id]
+        self.inFlightCounts[transmission.topic] -= 1
+
+    # drop acknowledged messages so their state does not pile up over a mission
+    def processAcknowledgments(self) -> None:
+        now = time.time()
+        for messageID in self.acknowledgedMessageIDs.drain():
+            transmission = self.inFlight.pop(messageID, None)
+            if transmission is None:
+                continue
+            self.inFlightCounts[transmission.topic] -= 1
+            self.acknowledgedBytes[transmission.topic] = self.acknowledgedBytes.get(transmission.topic, 0) + len(transmission.message.payload)
+            # Karn's algorithm: a retransmitted message's ack is ambiguous
+            if transmission.retransmissions == 0:
+                self.roundTripTimer.addSample(now - transmission.sentAt)
+
+    def dropClearedTopics(self) -> None:
+        for topic in self.clearedTopics.drain():
+            for transmission in [transmission for transmission in self.inFlight.values() if transmission.topic == topic]:
+                self.dropTransmission(transmission)
+
+    # selective repeat: resend only the messages whose own timer ran out
+    def retransmitExpired(self) -> None:
+        now = time.time()
+        expired = [transmission for transmission in self.inFlight.values()
+                   if now - transmission.sentAt >= self.roundTripTimer.timeout(transmission.retransmissions)]
+
+        for transmission in expired:
+            messageID = transmission.message.msg_id
+            if self.inFlight.get(messageID) is not transmission:
+                continue # superseded while an earlier retransmission was waiting on the link
+            if transmission.retransmissions >= Scheduler.MAX_RETRANSMISSIONS:
+                print(f'--Error: message {messageID} of purpose {transmission.message.purpose.name} was never acknowledged, dropping it')
+                self.dropTransmission(transmission)
+                continue
+
+            # a newer message with the same key is about to go out, don't resend the stale one
+            if transmission.key is not None and self.hasQueuedReplacement(transmission.topic, transmission.key):
+                self.dropTransmission(transmission)
+                continue
+
+            try:
+                self.pace(transmission.message)
+                if self.inFlight.get(messageID) is not transmission:
+                    continue
+                self.readerWriter.writeMessage(transmission.message)
+                print(f'retransmitted message {messageID}')
+            except Exception as e:
+                print(f'--Error: retransmitting message {messageID}: {e}')
+            transmission.sentAt = time.time()
+            transmission.retransmissions += 1
+            self.inFlight.move_to_end(messageID)
 
     # weighted round robin algorithm?
     # implement with a thread, I think
     def sendMessages(self, messageQueue : MessageQueue):
      try:
         print("started up the wrr", self.topics)
-        start = time.time()
         while messageQueue.isRunning():
+            self.processAcknowledgments()
+            self.dropClearedTopics()
+            self.sendPriorityMessages()
+            # deficit round robin: each topic may send up to its byte budget per round,
+            # unused budget carries over while the topic still has messages waiting
             for topic in self.topics: # all the topic names
-                c = 0 # packet counter
-                while self.messages[topic] and c < self.topics[topic]:
+                if not self.messages[topic]:
+                    self.deficits[topic] = 0
+                    continue
+                if not self.hasWindowSpace(topic):
+                    continue
+                self.deficits[topic] += self.budgets[topic]
+                while self.hasWindowSpace(topic):
+                    currentMessage = self.peekMessage(topic)
+                    if currentMessage is None:
+                        break
+                    size = self.readerWriter.frameSize(currentMessage)
+                    if size > self.deficits[topic]:
+                        break
+                    if self.hasPriorityMessages():
+                        self.sendPriorityMessages()
                     try:
-                        currentMessage = self.messages[topic].popleft()
-                        self.readerWriter.writeMessage(currentMessage)
-                        print(f'sent message of purpose {currentMessage.purpose.name}')
-
-                        if currentMessage.purpose != Message.Purpose.ACK:
-                            self.retransmissionQueue.append(currentMessage)
-
-                        c += 1
+                        with self.condition:
+                            # a LATEST topic may have replaced it in the meantime
+                            if not self.messages[topic] or self.messages[topic][0] is not currentMessage:
+                                continue
+                            self.messages[topic].popleft()
+                        self.compress(topic, currentMessage)
+                        self.deficits[topic] -= self.readerWriter.frameSize(currentMessage)
+                        self.send(currentMessage, topic)
                     except Exception as e:
                         print(f'--Error: in the scheduler loop: {e}')
 
-            # pop a message
-            if time.time() - start < 1:
-                continue
-            start = time.time()
-            limit = min(Scheduler.RETRANSMISSION_COUNTER, len(self.retransmissionQueue))
-            for _ in range(limit):
-                currentMessage = self.retransmissionQueue.popleft()
-                if not self.wasMessageAcknowledged(currentMessage):
-                    self.readerWriter.writeMessage(currentMessage)
-                    print('readded message')
-                    self.retransmissionQueue.append(currentMessage)
+            self.retransmitExpired()
+            self.waitForWork()
      except Exception as e:
         print('scheduler', e)
         # talkerNode.destroy_node()
@@ -98,5 +529,5 @@ class Scheduler:
     def __str__(self) -> str:
         ret_str = ""
         for topic in self.topics:
-            ret_str =f'{ret_str}:name={topic},wrr={self.topics[topic]},num_msg={len(self.messages[topic])}'
+            ret_str =f'{ret_str}:name={topic},wrr={self.topics[topic]},budget={self.budgets[topic]},num_msg={len(self.messages[topic])},in_flight={self.inFlightCounts[topic]}'
         return ret_str
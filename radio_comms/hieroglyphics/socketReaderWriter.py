@@ -1,14 +1,30 @@
-import struct
 import socket
+import time
 
 from message import Message
+from messageCodec import MessageCodec
+from checksum import Checksum, XorChecksum
 from readerWriter import ReaderWriter
 from messageQueue import MessageQueue
+from streamDeframer import StreamDeframer
 
 class SocketReaderWriter(ReaderWriter):
-    
-    def __init__(self, host, port, messageQueue : MessageQueue, rover : bool):
+
+    # a send has to block this long before it says anything about the link rate
+    MIN_BLOCKED_TIME=0.005
+    # sends that don't block raise the estimate by this much, like RateController
+    # probing for more throughput, and after UNPACED_SENDS in a row pacing stops
+    PROBE_GAIN=1.1
+    UNPACED_SENDS=64
+    CHUNK_SIZE=16384
+
+    def __init__(self, host, port, messageQueue : MessageQueue, rover : bool, checksum : type[Checksum]=XorChecksum):
         self.messageQueue = messageQueue
+        self.codec = MessageCodec(checksum=checksum)
+        self.deframer = StreamDeframer(self.readInto, self.codec, maxPayloadSize=2 * SocketReaderWriter.CHUNK_SIZE)
+        # measured from how long sendall blocks once the kernel buffer is full
+        self.measuredRate : float = None
+        self.unblockedSends = 0
         s = socket.socket()
 
         if rover:
@@ -19,47 +35,36 @@ class SocketReaderWriter(ReaderWriter):
         else:
             s.connect((host, port))
             self.communicator = s
-
-    def writeMessage(self, message : Message):
-        self.communicator.send(message.get_as_bytes())
-
-    def readBytes(self, num_bytes : int):
         self.communicator.settimeout(1.0)
-        read_bytes = b''
-        while len(read_bytes) < num_bytes:
-            read_bytes += self.communicator.recv(num_bytes - len(read_bytes))
 
-        return read_bytes
-    
-    def readMessage(self) -> Message:
-        potentialMessage = Message(new=False)
+    # None while sends never block, i.e. the link is keeping up
+    def bytesPerSecond(self) -> float:
+        return self.measuredRate
+
+    def writeMessage(self, message : Message):
+        frame = self.codec.encode(message)
+        start = time.time()
+        self.communicator.sendall(frame)
+        blocked = time.time() - start
+        if blocked >= SocketReaderWriter.MIN_BLOCKED_TIME:
+            rate = len(frame) / blocked
+            self.measuredRate = rate if self.measuredRate is None else 0.8 * self.measuredRate + 0.2 * rate
+            self.unblockedSends = 0
+        elif self.measuredRate is not None:
+            # the link kept up, it may be faster than measured by now
+            self.unblockedSends += 1
+            if self.unblockedSends >= SocketReaderWriter.UNPACED_SENDS:
+                self.measuredRate = None
+                self.unblockedSends = 0
+            else:
+                self.measuredRate *= SocketReaderWriter.PROBE_GAIN
 
+    def readInto(self, buffer : memoryview) -> int:
         try:
-            b_id = self.readBytes(2)
+            return self.communicator.recv_into(buffer)
         except TimeoutError:
-            return None
-        potentialMessage.set_msg_id(struct.unpack(">H", b_id)[0])
+            return 0
 
-        b_purpose = self.readBytes(1)
-        potentialMessage.set_purpose(struct.unpack(">B", b_purpose)[0])
-
-        b_number = self.readBytes(1)
-        potentialMessage.number = struct.unpack(">B", b_number)[0]
-
-        b_size = self.readBytes(4)
-        potentialMessage.set_size(struct.unpack(">L", b_size)[0])
-
-        if potentialMessage.size_of_payload > 4096:
-            print(f"--Error: buffer? ID: {potentialMessage.msg_id}, purpose: {potentialMessage.purpose}, num: {potentialMessage.number}, len_payload: {potentialMessage.size_of_payload}")
-
-        payload = self.readBytes(potentialMessage.size_of_payload)
-        potentialMessage.set_payload(payload)
-
-        checksum = self.readBytes(1)
-        same_checksums, calculated_checksum = Message.test_checksum(bytestring=potentialMessage.get_as_bytes()[:-1], checksum=checksum)
-
-        if not same_checksums:    
-            print(f"--Error: checksum. Received checksum: {checksum} | calculated checksum: {calculated_checksum}. {potentialMessage}")
-            return None
-
-        return potentialMessage
+    # returns None if no complete message arrived before the timeout
+    def readMessage(self) -> Message:
+        return self.deframer.readMessage()
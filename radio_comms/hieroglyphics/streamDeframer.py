@@ -0,0 +1,109 @@
+import compression
+from message import Message
+from messageCodec import MessageCodec
+
+# Incremental deframer shared by the reader/writers.
+# Reads whatever the transport has in large blocks into one buffer
+# and cuts complete frames out of it, instead of one read per field.
+# If a header or payload checksum is bad it scans forward to the next
+# sync word, so noise costs the damaged frame and nothing after it.
+class StreamDeframer:
+
+    PURPOSES = frozenset(int(purpose) for purpose in Message.Purpose)
+
+    # readInto: callable(memoryview) -> int, fills the view with up to
+    # len(view) bytes and returns how many were read (0 on timeout)
+    def __init__(self, readInto, codec : MessageCodec, maxPayloadSize : int=MessageCodec.MAX_PAYLOAD_SIZE, bufferSize : int=65536):
+        self.readInto = readInto
+        self.codec = codec
+        self.maxPayloadSize = maxPayloadSize
+        self.maxFrameSize = MessageCodec.HEADER_SIZE + maxPayloadSize + codec.checksumSize
+        self.buffer = bytearray(max(bufferSize, 2 * self.maxFrameSize))
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        self.discarded = 0
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    # returns the next complete message, reading from the transport at most once
+    def readMessage(self) -> Message:
+        message = self.nextMessage()
+        if message is None and self.fill():
+            message = self.nextMessage()
+        return message
+
+    def fill(self) -> int:
+        if len(self.buffer) - self.end < self.maxFrameSize:
+            self.compact()
+        read = self.readInto(self.view[self.end:])
+        if read:
+            self.end += read
+        return read or 0
+
+    # move the unread bytes to the front of the buffer
+    def compact(self) -> None:
+        length = len(self)
+        self.view[:length] = self.view[self.start:self.end]
+        self.start = 0
+        self.end = length
+
+    def discard(self, num_bytes : int) -> None:
+        self.start += num_bytes
+        self.discarded += num_bytes
+
+    # drop bytes up to the next sync word after the current position
+    def resynchronize(self) -> None:
+        nextSync = self.buffer.find(MessageCodec.SYNC, self.start + 1, self.end)
+        if nextSync == -1:
+            # the last byte may be the first half of a sync word
+            nextSync = max(self.start + 1, self.end - len(MessageCodec.SYNC) + 1)
+        self.discard(nextSync - self.start)
+
+    # parse a message out of the bytes already buffered, None if there is no full frame yet
+    def nextMessage(self) -> Message:
+        headerSize = MessageCodec.HEADER_SIZE
+        while len(self) >= headerSize:
+            header = self.view[self.start:self.start + headerSize]
+            decoded = MessageCodec.decodeHeader(header, self.maxPayloadSize)
+            if decoded is None or decoded[1] not in StreamDeframer.PURPOSES:
+                self.resynchronize()
+                continue
+
+            msg_id, purpose, number, size_of_payload, flags, session = decoded
+            payloadEnd = self.start + headerSize + size_of_payload
+            frameEnd = payloadEnd + self.codec.checksumSize
+            if frameEnd > self.end:
+                return None
+
+            if self.discarded:
+                print(f"--Error: resynchronized after discarding {self.discarded} bytes")
+                self.discarded = 0
+
+            payload = self.view[self.start + headerSize:payloadEnd]
+            checksum = self.view[payloadEnd:frameEnd]
+            same_checksums, calculated_checksum = self.codec.verify(payload, checksum)
+            if not same_checksums:
+                print(f"--Error: checksum. Received checksum: {bytes(checksum)} | calculated checksum: {calculated_checksum}. ID: {msg_id}, purpose: {purpose}, len_payload: {size_of_payload}")
+                # a lost or extra byte in the payload shifts the next sync word, so scan for it
+                self.resynchronize()
+                self.discarded = 0
+                continue
+
+            self.start = frameEnd
+            compressorID = flags & MessageCodec.COMPRESSION_MASK
+            if compressorID:
+                # a compressed payload came from one no bigger than the limit
+                try:
+                    payload = compression.decompress(compressorID, payload, self.maxPayloadSize)
+                except ValueError as e:
+                    print(f"--Error: could not decompress message {msg_id}: {e}")
+                    continue
+
+            message = Message(new=False, purpose=Message.Purpose(purpose), payload=bytes(payload), number=number)
+            message.set_msg_id(msg_id)
+            message.session = session
+            return message
+
+        return None
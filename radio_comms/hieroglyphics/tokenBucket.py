@@ -0,0 +1,35 @@
+import time
+
+# Token bucket for pacing bytes onto a link.
+# Tokens (bytes) refill at `rate` per second up to `capacity`,
+# which is how much may go out in one burst.
+class TokenBucket:
+
+    def __init__(self, rate : float, capacity : float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.time()
+
+    def setRate(self, rate : float) -> None:
+        self.refill()
+        self.rate = rate
+
+    def refill(self) -> None:
+        now = time.time()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    # seconds until num_bytes may be sent; frames bigger than the bucket
+    # only wait for a full bucket and then go into debt
+    def delay(self, num_bytes : int) -> float:
+        self.refill()
+        needed = min(num_bytes, self.capacity)
+        if self.tokens >= needed:
+            return 0
+        return (needed - self.tokens) / self.rate
+
+    def consume(self, num_bytes : int) -> None:
+        self.refill()
+        self.tokens -= num_bytes
+
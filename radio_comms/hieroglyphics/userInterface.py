@@ -2,15 +2,17 @@ from messageQueue import MessageQueue
 from readerWriter import ReaderWriter
 from message import Message
 from scheduler import Scheduler
+from fileTransfer import FileTransfer
 import os
 import capture_controls
 import struct
 import subprocess
 
 class UserInterface:
-    def __init__(self, messageLog : str, scheduler : Scheduler):
+    def __init__(self, messageLog : str, scheduler : Scheduler, fileTransfer : FileTransfer=None):
         self.log = messageLog
         self.scheduler = scheduler
+        self.fileTransfer = fileTransfer if fileTransfer is not None else FileTransfer(scheduler)
 
     def printLog(self) -> None:
         tail_output = subprocess.run(["tail", '-n', 10, self.log], capture_output=True, text=True)
@@ -66,10 +68,23 @@ class UserInterface:
             except Exception as e:
                 print(f'--sending message: {e}')
 
+    # the payload names the camera to take the photo with
     def sendRequestMessage(self, purpose : Message.Purpose):
-        message = Message(new=True, purpose=purpose, payload=bytes(1))
+        cam_num = self.request_camera()
+        if cam_num == -1:
+            print("Error: invalid camera. Returning to menu.")
+            return
+        message = Message(new=True, purpose=purpose, payload=struct.pack(">B", cam_num))
         self.scheduler.addMessage(message)
 
+    # an HD photo arrives in growing resolutions, this can stop the rest of it
+    def sendHighDefPhotoRequestMessage(self):
+        if input("c to cancel the HD photo being sent, else take one: >> ") == 'c':
+            message = Message(new=True, purpose=Message.Purpose.HIGH_DEFINITION_PHOTO, payload=struct.pack(">BB", 0, 1))
+            self.scheduler.addMessage(message)
+            return
+        self.sendRequestMessage(Message.Purpose.HIGH_DEFINITION_PHOTO)
+
     def request_camera(self) -> int:
         try:
             cam_num = int(input("Pick camera: (0-4) for cams 0-4"))
@@ -82,11 +97,14 @@ class UserInterface:
     def sendVideoRequestMessage(self):
         stop_request = input("n to stop feed, else start: >> ")
         cam_num = -1
-        if stop_request == 'n':
+        delta_mode = False
+        if stop_request != 'n':
             cam_num = self.request_camera()
             if cam_num == -1:
                 return
-        b_cam = struct.pack(">b", cam_num)
+            # only changed parts of the picture between keyframes, for a rover standing still
+            delta_mode = input("delta mode? (y/N) >> ") == 'y'
+        b_cam = struct.pack(">bB", cam_num, delta_mode)
         message = Message(new=True, purpose=Message.Purpose.VIDEO, payload=b_cam)
         self.scheduler.addMessage(message)
 
@@ -96,14 +114,24 @@ class UserInterface:
         if not os.path.exists(path):
             print(f"Error: file {path} does not exist. Returning to menu.")
             return 
-        with open(path, 'rb') as f:
-            contents = f.read()
-        basename = os.path.basename(path)
-        message_title = Message(new=True, purpose=Message.Purpose.FILE_CONTENTS, number=1, payload=basename.encode())
-        messages = Message.message_split(purpose_for_all=Message.Purpose.FILE_CONTENTS, big_payload=contents, index_offset=1)
+        self.fileTransfer.sendFile(path)
+
+    def requestFileContents(self) -> None:
+        print('Enter path or glob of file(s) ON ROVER:')
+        pattern = input('>> ')
+        print('Enter byte range as "offset length" (negative offset counts from the end, length 0 = to the end), or nothing for whole file(s):')
+        byteRange = input('>> ').split()
+        try:
+            offset = int(byteRange[0]) if byteRange else 0
+            length = int(byteRange[1]) if len(byteRange) > 1 else 0
+        except ValueError:
+            print(f"Error: invalid byte range {' '.join(byteRange)}. Returning to menu.")
+            return
+        self.scheduler.addMessage(FileTransfer.fetchRequest(pattern, offset, length))
 
-        self.scheduler.addMessage(message_title)
-        self.scheduler.addListOfMessages(messages)
+    def requestListing(self) -> None:
+        print('Enter directory or glob ON ROVER:')
+        self.scheduler.addMessage(FileTransfer.listRequest(input('>> ')))
 
     def print_options(self) -> None:
         print("----------------")
@@ -123,7 +151,8 @@ class UserInterface:
         print("(wrd) for sending word to arm to type out")
         print("(hbt) Heartbeat mode: Receive coordinates")
         print("(f) Copy file from base station to rover")
-        print("(cp) Copy file from rover to base station")
+        print("(cp) Copy file(s), or part of them, from rover to base station")
+        print("(ls) List files on the rover")
         print("(test) Send over tester strings for debugging purposes")
         print("(stop) Make rover stop moving right now!!!")
         print("(literally anything else) See menu options again")
@@ -156,7 +185,7 @@ class UserInterface:
                 self.sendVideoRequestMessage()
             
             elif request == "hdp":
-                self.sendRequestMessage(Message.Purpose.HIGH_DEFINITION_PHOTO)
+                self.sendHighDefPhotoRequestMessage()
             
             elif request == "ldp":
                 self.sendRequestMessage(Message.Purpose.LOW_DEFINITION_PHOTO)
@@ -165,7 +194,7 @@ class UserInterface:
                 self.sendFileContents()
             
             elif request == 'cp':
-                print('Enter path to file ON ROVER:')
-                path = input(">> ")
-                message = Message(new=True, purpose=Message.Purpose.REQUEST_FILE, payload=path.encode())
-                self.scheduler.addMessage(message)
+                self.requestFileContents()
+
+            elif request == 'ls':
+                self.requestListing()
@@ -0,0 +1,124 @@
+import threading
+import time
+
+from deltaFrame import DeltaEncoder
+from imageCapturer import ImageCapturer
+from message import Message
+from rateController import RateController
+from scheduler import Scheduler
+
+# Live video over the radio link. Takes the newest frame from the
+# ImageCapturer's capture thread, encodes it and queues it as one chunked
+# transfer on the video topic, no faster than the link delivers them. Quality,
+# width and frame rate come from a RateController. If the previous frame is
+# still waiting to go out, the new one is dropped instead of letting the feed
+# fall further behind.
+# In delta mode (see deltaFrame.py) only the tiles that changed since the last
+# frame are sent between periodic keyframes, and a frame where nothing changed
+# is not sent at all.
+class VideoStreamer:
+
+    # used until the link reports its rate
+    DEFAULT_FPS=2
+    # longest wait for a frame (or the camera to open) at a time, so stop() never blocks message processing for long
+    FRAME_WAIT=0.2
+
+    def __init__(self, imageCapturer : ImageCapturer, scheduler : Scheduler, topic : str='vid_feed', rateController : RateController=None):
+        self.imageCapturer = imageCapturer
+        self.scheduler = scheduler
+        self.topic = topic
+        self.rateController = rateController if rateController is not None else RateController(scheduler, topic)
+        self.running = False
+        # set by stop(), wakes the streaming thread from its wait for the next frame slot
+        self.stopEvent = threading.Event()
+        self.thread : threading.Thread = None
+        self.framesSent = 0
+        self.framesDropped = 0
+        # None while sending whole frames
+        self.deltaEncoder : DeltaEncoder = None
+
+    def isRunning(self) -> bool:
+        return self.running
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.running = True
+        self.stopEvent.clear()
+        self.imageCapturer.startCapturing()
+        self.thread = threading.Thread(target=self.stream, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.running = False
+        self.stopEvent.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # takes effect from the next frame, which is a keyframe
+    def setDeltaMode(self, enabled : bool) -> None:
+        if not enabled:
+            self.deltaEncoder = None
+        elif self.deltaEncoder is None:
+            self.deltaEncoder = DeltaEncoder()
+        else:
+            self.deltaEncoder.requestKeyframe()
+
+    # the base station lost a frame the deltas build on
+    def requestKeyframe(self) -> None:
+        deltaEncoder = self.deltaEncoder
+        if deltaEncoder is not None:
+            deltaEncoder.requestKeyframe()
+
+    # (payload, whether it is a whole frame); payload is None if nothing changed
+    def encodeFrame(self, frame) -> tuple[memoryview, bool]:
+        quality, width = self.rateController.quality(), self.rateController.width()
+        deltaEncoder = self.deltaEncoder
+        if deltaEncoder is None:
+            return ImageCapturer.encodeImage(frame, quality, width), True
+        return deltaEncoder.encode(ImageCapturer.resizeImage(frame, width), quality)
+
+    def frameInterval(self, frameSize : int) -> float:
+        interval = self.rateController.frameInterval(frameSize)
+        return interval if interval is not None else 1 / VideoStreamer.DEFAULT_FPS
+
+    def stream(self) -> None:
+        frameNumber = -1
+        frameSize = 0
+        nextFrame = time.time()
+        while self.running:
+            delay = nextFrame - time.time()
+            if delay > 0 and self.stopEvent.wait(delay):
+                break
+
+            frameNumber, frame = self.imageCapturer.getLatestFrame(after=frameNumber, timeout=VideoStreamer.FRAME_WAIT,
+                                                                     openTimeout=VideoStreamer.FRAME_WAIT)
+            if frame is None:
+                continue
+
+            nextFrame = time.time() + self.frameInterval(frameSize)
+            # the backlog already holds more than the last frame: the link is not keeping up
+            if frameSize and self.scheduler.queuedBytes(self.topic) > frameSize:
+                self.framesDropped += 1
+                continue
+
+            try:
+                buffer, keyframe = self.encodeFrame(frame)
+            except Exception as e:
+                print(f'--Error: encoding video frame: {e}')
+                continue
+            if buffer is None:
+                continue
+            frameSize = len(buffer)
+            # quality and width follow whole frames only; a delta is small
+            # because little changed, not because the link has room
+            if keyframe:
+                self.rateController.frameEncoded(frameSize)
+            else:
+                self.rateController.measure()
+            nextFrame = time.time() + self.frameInterval(frameSize)
+            # queued as a list so the backlog can be measured
+            self.scheduler.addListOfMessages(list(Message.transfer_split(big_payload=buffer, purpose_for_all=Message.Purpose.VIDEO,
+                                                                          chunk_size=self.scheduler.chunkSize())), self.topic)
+            self.framesSent += 1
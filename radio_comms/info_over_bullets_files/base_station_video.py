@@ -3,6 +3,14 @@
 import zmq
 import cv2
 import numpy as np
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def decode(message):
+    # decode the image, skipping the "{i}/" topic prefix
+    image = np.frombuffer(message, dtype=np.uint8, offset=message.index(b'/') + 1)
+    return cv2.imdecode(image, 1)
 
 
 def main():
@@ -10,38 +18,80 @@ def main():
     HOST = "192.168.11.17"
     PORT = 12345
     NUM_CAMS = 2
+    # how long to wait for frames before refreshing the windows, in ms
+    POLL_TIMEOUT = 10
 
     sockets = []
+    poller = zmq.Poller()
 
     # create subscribe socket
     context = zmq.Context()
 
     for i in range(0, NUM_CAMS):
         socket = context.socket(zmq.SUB)
+        # keep only the newest frame per camera, older ones are never shown anyway
+        # (has to be set before connecting)
+        socket.setsockopt(zmq.CONFLATE, 1)
 
         # connect to the video publish socket
         socket.connect(f"tcp://{HOST}:{PORT}")
         socket.subscribe(f"{i}/") # subscribe to only certain things
         sockets.append(socket)
+        poller.register(socket, zmq.POLLIN)
 
     print("connection established")
 
-    while True:
-        # receive the message (an encoded image)
-        for i in range(0, NUM_CAMS):
-            message = sockets[i].recv()
-            if not message:
-                break
-            print("received message")
-            # decode the image and show it
-            image = np.frombuffer(message[2:], dtype=np.uint8)
-            frame = cv2.imdecode(image, 1)
-            cv2.imshow(f'frame{i}',frame)
+    # decoding happens on the pool, one frame per camera at a time; the newest
+    # frame that arrives meanwhile waits in pending and older ones are dropped
+    executor = ThreadPoolExecutor(max_workers=NUM_CAMS)
+    lock = threading.Lock()
+    pending = [None] * NUM_CAMS
+    decoding = [False] * NUM_CAMS
+    latest = [None] * NUM_CAMS
+
+    def decode_camera(i, message):
+        try:
+            frame = decode(message)
+        except Exception as e:
+            print(f'could not decode frame of camera {i}: {e}')
+            frame = None
+        with lock:
+            if frame is not None:
+                latest[i] = frame
+            message = pending[i]
+            pending[i] = None
+            decoding[i] = message is not None
+        if message is not None:
+            executor.submit(decode_camera, i, message)
+
+    try:
+        while True:
+            # receive messages (encoded images) from whichever cameras have one
+            for socket, _ in poller.poll(POLL_TIMEOUT):
+                i = sockets.index(socket)
+                message = socket.recv()
+                with lock:
+                    if decoding[i]:
+                        pending[i] = message
+                        continue
+                    decoding[i] = True
+                executor.submit(decode_camera, i, message)
+
+            # show the newest decoded frame of every camera that has a new one
+            with lock:
+                frames = [(i, frame) for i, frame in enumerate(latest) if frame is not None]
+                for i, _ in frames:
+                    latest[i] = None
+            for i, frame in frames:
+                cv2.imshow(f'frame{i}', frame)
             cv2.waitKey(1)
+    except KeyboardInterrupt:
+        pass
 
+    executor.shutdown(wait=False, cancel_futures=True)
     cv2.destroyAllWindows()
     for socket in sockets:
         socket.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -130,7 +130,7 @@ if __name__ == "__main__":
     encoded, buffer = cv2.imencode('.jpg', frame, encode_param)
 
     try:
-        socket.send("0/".encode() + buffer.tobytes())
+        socket.send("0/".encode() + buffer.data)
     except Exception as e:
         print(e)
     #socket.send(b'adsfasdfasdf')
@@ -3,40 +3,94 @@
 import cv2
 import zmq
 import time
+import threading
 
 ###### CONSTANTS ######
 HOST = "0.0.0.0"
 PORT = 12345
 QUALITY = 80
-TIME_BETWEEN_FRAMES = 0.05
+# frames per second published per camera, each camera is paced on its own
+FPS = 10
+# wait before reopening a camera that stopped delivering frames
+RECONNECT_DELAY = 1.0
 CAM_PATHS = [
     '/dev/v4l/by-id/usb-046d_081b_32750F50-video-index0',
     '/dev/v4l/by-id/usb-Sonix_Technology_Co.__Ltd._USB_Live_camera_SN0001-video-index0'
 ]
-NUM_CAMS = 1
-# create publish socket and video capture object
+
+# create publish socket
 context = zmq.Context()
 socket = context.socket(zmq.PUB)
-caps = [cv2.VideoCapture(0)]
+# zmq sockets are not thread safe, the camera threads take turns sending
+socket_lock = threading.Lock()
+running = True
+
+
+def open_camera(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        cap.release()
+        return None
+    # keep as little as possible queued in the driver so frames are current
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+
+# capture, encode and publish one camera on topic "{i}/"; cv2 releases the GIL
+# while reading and encoding, so a slow camera doesn't hold up the others
+def stream_camera(i, path):
+    prefix = f'{i}/'.encode()
+    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), QUALITY]
+    cap = None
+    next_frame = time.time()
+    while running:
+        if cap is None:
+            cap = open_camera(path)
+            if cap is None:
+                print(f'could not open camera {i} ({path}), retrying')
+                time.sleep(RECONNECT_DELAY)
+                continue
+
+        delay = next_frame - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        # don't try to catch up on frames that were late
+        next_frame = max(next_frame + 1 / FPS, time.time())
+
+        ret, frame = cap.read()
+        if not ret:
+            print(f'camera {i} stopped delivering frames, reconnecting')
+            cap.release()
+            cap = None
+            time.sleep(RECONNECT_DELAY)
+            continue
+
+        encoded, buffer = cv2.imencode('.jpg', frame, encode_param)
+        if not encoded:
+            continue
+        try:
+            with socket_lock:
+                socket.send(prefix + buffer.data)
+        except Exception as e:
+            print(e)
+
+    if cap is not None:
+        cap.release()
 
 
 # bind the host and port
 socket.bind(f"tcp://{HOST}:{PORT}")
 
-while True:
-    # capture frame; if successful encode it and publish it with quality QUALITY
-    for i in range(0, NUM_CAMS):
-        ret, frame = caps[i].read()
-        if ret:
-            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), QUALITY]
-            encoded, buffer = cv2.imencode('.jpg', frame, encode_param)
-            try:
-                socket.send(f'{i}/'.encode() + buffer.tobytes())
-            except Exception as e:
-                print(e)
-            #socket.send(b'adsfasdfasdf')
-        time.sleep(0.5)
-for cap in caps:
-    cap.release()
-cv2.destroyAllWindows()
+threads = [threading.Thread(target=stream_camera, args=(i, path), daemon=True) for i, path in enumerate(CAM_PATHS)]
+for thread in threads:
+    thread.start()
+
+try:
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(1)
+except KeyboardInterrupt:
+    pass
+running = False
+for thread in threads:
+    thread.join()
 socket.close()